@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Throughput benchmarks of the pre-processing chain and the feature detection
+             of the modules on synthetic image series. Reports frames/s, the cost per
+             feature and the peak memory and appends the results to a JSON history. Runs
+             slower than the previous run are reported as regressions.
+             Usage: python TrackerLabBenchmark.py --help
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os, sys, json, time, platform
+import argparse
+import subprocess
+import tracemalloc
+
+import numpy as np
+
+from Benchmarks import Synthetic
+from Utils import Preprocessing, Batch, FrameSource
+from Utils.Profiler import Profiler
+from Modules.Utils import registry
+from Modules.Utils.features import FeatureBuffer
+
+
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+historyFile = os.path.join(rootDir, 'Benchmarks', 'history.json')
+
+# Module: (generator of the synthetic series, module parameters by widget name). All parameters are set
+# explicitly, i.e. the results do not depend on the module settings last used in the GUI.
+modules = {'Difference-Of-Gaussians': (Synthetic.gaussianSpots, {'thresholdSpinBox': 10, 'maxSigmaSpinBox': 5}),
+           'Template': (Synthetic.gaussianSpots, {'thresholdSpinBox': 10, 'maxSigmaSpinBox': 5}),
+           'Connected-Component': (Synthetic.blobs, {'thresholdSpinBox': 500, 'invertCheckBox': 0, 'minAreaSpinBox': 10,
+                                                     'maxAreaSpinBox': 1000, 'maxFeaturesSpinBox': 1000}),
+           'Hough-Transform': (Synthetic.rings, {'sigmaSpinBox': 3, 'minRadiusSpinBox': 5, 'maxRadiusSpinBox': 15,
+                                                 'thresholdSpinBox': 0.5}),
+           'Ellipsoid-Tracker': (Synthetic.janusEllipsoids, {'thresholdSpinBox': 400, 'invertCheckBox': 0, 'minAreaSpinBox': 20,
+                                                             'maxAreaSpinBox': 1000, 'maxFeaturesSpinBox': 1000}),
+           'Janus-Particles': (Synthetic.janusEllipsoids, {'thresholdSpinBox': 400, 'minAreaSpinBox': 20, 'maxAreaSpinBox': 1000,
+                                                           'maxFeaturesSpinBox': 1000, 'MinSphericitySpinBox': 0,
+                                                           'SeparateClosePairsCheckBox': 0})}
+
+# Module parameters of the precision benchmark which differ from modules: the mean subtraction removes most of
+# the intensity of the slowly moving particles and the binned particles are smaller
+precisionParameters = {'Connected-Component': {'thresholdSpinBox': 150, 'minAreaSpinBox': 3},
+                       'Ellipsoid-Tracker': {'thresholdSpinBox': 100, 'minAreaSpinBox': 5},
+                       'Janus-Particles': {'thresholdSpinBox': 100, 'minAreaSpinBox': 5}}
+
+# Pre-processing settings of the pre-processing benchmark: all steps enabled
+def preprocessingSettings(size):
+    return Preprocessing.Settings(binning=2, subtractMean=True, median=3, roi=(size//16, size//16, size//4, size//4),
+                                  mask=(Preprocessing.CIRCLE, size//16, size//16, size//4, size//4), invert=True)
+
+
+# Pre-processing settings of the precision benchmark: binning and mean subtraction are computed in the working dtype
+def precisionSettings(dtype):
+    return Preprocessing.Settings(binning=2, subtractMean=True, median=3, dtype=dtype)
+
+
+def peakMemory(function, *args):
+    # Peak memory allocated by Python and NumPy while calling function in MB
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]/1024**2
+    finally:
+        tracemalloc.stop()
+
+
+def benchmarkPreprocessing(images):
+    # The full pre-processing pipeline in blocks of frames: binning, subtract mean, median, ROI, mask and invert
+    settings = preprocessingSettings(images.shape[1]//2)
+    mean = images.mean(axis=0)
+    profiler = Profiler()
+    def run(frames, profiler=None):
+        pipeline = Preprocessing.Pipeline(settings, mean)
+        for _, block in FrameSource.iterChunks(frames):
+            pipeline.process(block, profiler)
+    run(images[:1]) # warm up
+    t0 = time.perf_counter()
+    run(images, profiler)
+    duration = time.perf_counter() - t0
+    return {'fps': len(images)/duration,
+            'ms_per_frame': 1000*duration/len(images),
+            'peak_memory_mb': peakMemory(run, images[:min(5, len(images))]),
+            'stages_ms': {name: values['mean_ms'] for name, values in profiler.statistics().items()}}
+
+
+def benchmarkModule(detector, images):
+    # Detection of the module on the frames (without pre-processing)
+    def run(frames):
+        return sum(len(detector(i, image.astype(float))) for i, image in enumerate(frames))
+    run(images[:1]) # warm up
+    t0 = time.perf_counter()
+    features = run(images)
+    duration = time.perf_counter() - t0
+    return {'fps': len(images)/duration,
+            'ms_per_frame': 1000*duration/len(images),
+            'features_per_frame': features/len(images),
+            'us_per_feature': 1e6*duration/features if features else None,
+            'peak_memory_mb': peakMemory(run, images[:min(5, len(images))])}
+
+
+def detectPipeline(detector, pipeline, images):
+    # Pre-processing and detection in blocks as by the batch processing
+    features = FeatureBuffer()
+    for start, block in FrameSource.iterChunks(images):
+        features.extend(detector.detectBatch(range(start, start + len(block)), pipeline.process(block)))
+    return features.toDataFrame()
+
+
+def positionDifferences(features, reference, tolerance=0.5):
+    # Distances of the matched features (nearest feature of the reference in the same frame within tolerance in px)
+    from scipy.spatial import cKDTree
+    distances = []
+    if len(features) == 0 or len(reference) == 0:
+        return np.array([])
+    for frame, group in reference.groupby('frame'):
+        other = features[features['frame'] == frame]
+        if len(other):
+            d, _ = cKDTree(group[['x', 'y']].values).query(other[['x', 'y']].values)
+            distances.append(d[d <= tolerance])
+    return np.concatenate(distances) if distances else np.array([])
+
+
+def benchmarkPrecision(detector, images, dtype='float32'):
+    # Pre-processing and detection with the working dtype compared to float64: frame rates, the maximum difference
+    # of the pre-processed images and the position differences of the features
+    mean = images.mean(axis=0)
+    pipelines = {d: Preprocessing.Pipeline(precisionSettings(d), mean) for d in ['float64', dtype]}
+    result = {}
+    for d, pipeline in pipelines.items():
+        suffix = '' if d == dtype else '_float64'
+        detectPipeline(detector, pipeline, images[:1]) # warm up
+        t0 = time.perf_counter()
+        for _, block in FrameSource.iterChunks(images):
+            pipeline.process(block)
+        result['preprocessing_fps' + suffix] = len(images)/(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        features = detectPipeline(detector, pipeline, images)
+        result['fps' + suffix] = len(images)/(time.perf_counter() - t0)
+        result['features' + suffix] = len(features)
+        result['peak_memory_mb' + suffix] = peakMemory(lambda frames: [pipeline.process(block) for _, block in FrameSource.iterChunks(frames)],
+                                                       images[:min(5, len(images))])
+        if suffix:
+            reference = features
+    difference = 0.0
+    for _, block in FrameSource.iterChunks(images):
+        difference = max(difference, float(np.max(np.abs(pipelines[dtype].process(block) - pipelines['float64'].process(block)))))
+    distances = positionDifferences(features, reference)
+    result.update({'speedup': result['fps']/result['fps_float64'],
+                   'max_image_difference': difference,
+                   'matched_features': len(distances),
+                   'max_position_difference_px': float(distances.max()) if len(distances) else None,
+                   'mean_position_difference_px': float(distances.mean()) if len(distances) else None})
+    return result
+
+
+def gitVersion():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=rootDir, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def runBenchmarks(moduleNames, sizes, densities, frames, seed=0):
+    results = []
+    for size in sizes:
+        images, _ = Synthetic.gaussianSpots(frames, size, densities[0], seed=seed)
+        result = {'benchmark': 'preprocessing', 'size': size, 'density': densities[0], 'frames': frames}
+        result.update(benchmarkPreprocessing(images))
+        results.append(result)
+        print('%-26s %5d px %5.1f/100x100 px %8.1f fps' % ('Pre-Processing', size, densities[0], result['fps']))
+    for name in moduleNames:
+        generator, parameters = modules[name]
+        try:
+            detector = Batch.createDetector(name, parameters)
+        except Exception as e:
+            results.append({'benchmark': 'module', 'module': name, 'error': str(e)})
+            print('%-26s error: %s' % (name, e))
+            continue
+        for size in sizes:
+            for density in densities:
+                images, particles = generator(frames, size, density, seed=seed)
+                result = {'benchmark': 'module', 'module': name, 'size': size, 'density': density, 'frames': frames, 'particles': particles}
+                try:
+                    result.update(benchmarkModule(detector, images))
+                    print('%-26s %5d px %5.1f/100x100 px %8.1f fps %8.1f features/frame' % (name, size, density, result['fps'], result['features_per_frame']))
+                except Exception as e:
+                    result['error'] = str(e)
+                    print('%-26s %5d px %5.1f/100x100 px error: %s' % (name, size, density, e))
+                results.append(result)
+    return results
+
+
+def precisionBenchmarks(moduleNames, sizes, densities, frames, seed=0, dtype='float32'):
+    results = []
+    for name in moduleNames:
+        generator, parameters = modules[name]
+        try:
+            detector = Batch.createDetector(name, dict(parameters, **precisionParameters.get(name, {})))
+        except Exception as e:
+            results.append({'benchmark': 'precision', 'module': name, 'error': str(e)})
+            print('%-26s error: %s' % (name, e))
+            continue
+        for size in sizes:
+            for density in densities:
+                images, particles = generator(frames, size, density, seed=seed)
+                result = {'benchmark': 'precision', 'module': name, 'dtype': dtype, 'size': size, 'density': density, 'frames': frames}
+                try:
+                    result.update(benchmarkPrecision(detector, images, dtype))
+                    if not result['matched_features']: # the positions are not compared
+                        raise RuntimeError('no matched features (features: %d, float64: %d)' % (result['features'], result['features_float64']))
+                    print('%-26s %5d px %5.1f/100x100 px %s: %8.1f fps (float64: %8.1f fps), pre-processing: %8.1f fps (float64: %8.1f fps), '
+                          'features: %d (float64: %d, matched: %d), max. difference: %.2g' % 
+                          (name, size, density, dtype, result['fps'], result['fps_float64'], result['preprocessing_fps'], result['preprocessing_fps_float64'],
+                           result['features'], result['features_float64'], result['matched_features'], result['max_image_difference']))
+                except Exception as e:
+                    result['error'] = str(e)
+                    print('%-26s %5d px %5.1f/100x100 px error: %s' % (name, size, density, e))
+                results.append(result)
+    return results
+
+
+def importBenchmarks(moduleNames):
+    # Import times of the modules (with Qt) and their kernels in new processes, e.g. the startup cost of a module
+    results = []
+    for name, times in registry.importReport(moduleNames).items():
+        results.append({'benchmark': 'import', 'module': name, 'module_import_s': times.get('module'), 'kernel_import_s': times.get('kernel')})
+        print('%-26s import: %s, kernel import: %s' % (name, *['%.3f s' % times[part] if times.get(part) is not None else '-' for part in ['module', 'kernel']]))
+    return results
+
+
+def resultKey(result):
+    return (result['benchmark'], result.get('module'), result.get('size'), result.get('density'))
+
+
+def loadHistory(file):
+    if not os.path.isfile(file):
+        return []
+    with open(file, 'r') as f:
+        return json.load(f)
+
+
+def compare(results, previous, tolerance):
+    # Results whose frame rate dropped by more than tolerance compared to the previous run
+    previousResults = {resultKey(result): result for result in previous['results'] if 'fps' in result}
+    regressions = []
+    for result in results:
+        reference = previousResults.get(resultKey(result))
+        if 'fps' in result and reference and result['fps'] < (1 - tolerance)*reference['fps']:
+            regressions.append((result, reference))
+    return regressions
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='TrackerLabBenchmark', description='Throughput benchmarks on synthetic image series.')
+    parser.add_argument('--modules', nargs='+', default=list(modules), choices=list(modules), metavar='MODULE', help='modules to benchmark (default: all)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[256, 512, 1024], help='image sizes in px (default: 256 512 1024)')
+    parser.add_argument('--densities', type=float, nargs='+', default=[2, 10], help='particles per 100 x 100 px (default: 2 10)')
+    parser.add_argument('--frames', type=int, default=20, help='frames per series (default: 20)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic series')
+    parser.add_argument('--history', default=historyFile, help='JSON history file (default: Benchmarks/history.json)')
+    parser.add_argument('--label', help='label of the run in the history, e.g. a branch name')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='relative drop of the frame rate reported as regression (default: 0.1)')
+    parser.add_argument('--imports', action='store_true', help='also measure the import times of all modules and their kernels')
+    parser.add_argument('--precision', action='store_true', help='also compare the pre-processing and detection with the float32 working dtype to float64')
+    parser.add_argument('--no-save', action='store_true', help='do not append the results to the history')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArguments(sys.argv[1:] if argv is None else argv)
+    results = runBenchmarks(args.modules, args.sizes, args.densities, args.frames, args.seed)
+    if args.precision:
+        results += precisionBenchmarks(args.modules, args.sizes, args.densities, args.frames, args.seed)
+    if args.imports:
+        results += importBenchmarks(registry.moduleNames())
+    run = {'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+           'label': args.label,
+           'version': gitVersion(),
+           'platform': platform.platform(),
+           'processor': platform.processor(),
+           'python': platform.python_version(),
+           'numpy': np.__version__,
+           'results': results}
+
+    history = loadHistory(args.history)
+    regressions = compare(results, history[-1], args.tolerance) if history else []
+    for result, reference in regressions:
+        print('Regression: %s %s %d px %.1f/100x100 px: %.1f fps (previous: %.1f fps, %s)' % (result['benchmark'], result.get('module', ''),
+              result['size'], result['density'], result['fps'], reference['fps'], history[-1].get('version')))
+    if not args.no_save:
+        history.append(run)
+        with open(args.history, 'w') as f:
+            json.dump(history, f, indent=1)
+        print('Saved: ' + args.history)
+    failures = [result for result in results if result['benchmark'] == 'precision' and 'error' in result]
+    return 1 if regressions or failures else 0
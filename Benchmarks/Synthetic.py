@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Synthetic microscopy image series generated in memory for the benchmarks.
+             The particles (Gaussian spots, blobs, rings and Janus ellipsoids) diffuse
+             with a random walk on a noisy background. The series are reproducible with
+             the seed.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+
+background = 100 # mean background counts
+noise = 10 # standard deviation of the background noise
+amplitude = 1000 # peak counts of the particles
+
+
+def particleCount(size, density):
+    # density in particles per 100 x 100 px
+    return max(1, int(round(density*size*size/1e4)))
+
+
+def trajectories(frames, size, n, margin, step, rng):
+    # Random walks of n particles reflected at the margins, shape (frames, n, 2) as (x, y)
+    positions = np.empty((frames, n, 2))
+    positions[0] = rng.uniform(margin, size - margin, (n, 2))
+    for i in range(1, frames):
+        p = positions[i - 1] + rng.normal(0, step, (n, 2))
+        p = np.where(p < margin, 2*margin - p, p)
+        p = np.where(p > size - margin, 2*(size - margin) - p, p)
+        positions[i] = p
+    return positions
+
+
+def render(frames, size, density, radius, shape, seed=0, step=1.0, orientations=False):
+    # Add shape(dx, dy, angle) (intensity in units of amplitude) in a window of +-radius around
+    # each particle position to a noisy background
+    rng = np.random.default_rng(seed)
+    n = particleCount(size, density)
+    positions = trajectories(frames, size, n, radius + 1, step, rng)
+    angles = rng.uniform(0, 2*np.pi, n) if orientations else np.zeros(n)
+    images = rng.normal(background, noise, (frames, size, size)).astype(np.float32)
+    r = int(np.ceil(radius))
+    for i in range(frames):
+        for (x, y), angle in zip(positions[i], angles):
+            x0, y0 = int(x), int(y)
+            yy, xx = np.mgrid[y0 - r:y0 + r + 1, x0 - r:x0 + r + 1]
+            images[i, y0 - r:y0 + r + 1, x0 - r:x0 + r + 1] += amplitude*shape(xx - x, yy - y, angle)
+    return np.clip(images, 0, 65535).astype(np.uint16), n
+
+
+def gaussianSpots(frames, size, density, sigma=2.0, seed=0):
+    # Diffraction limited spots, e.g. for the Difference-Of-Gaussians and Template modules
+    return render(frames, size, density, 4*sigma, lambda dx, dy, angle: np.exp(-(dx**2 + dy**2)/(2*sigma**2)), seed)
+
+
+def blobs(frames, size, density, radius=5.0, seed=0):
+    # Flat discs with a soft edge which can be thresholded, e.g. for the Connected-Component module
+    return render(frames, size, density, radius + 2, lambda dx, dy, angle: 1/(1 + np.exp(2*(np.hypot(dx, dy) - radius))), seed)
+
+
+def rings(frames, size, density, radius=10.0, width=1.5, seed=0):
+    # Ring-shaped particles, e.g. for the Hough-Transform module
+    return render(frames, size, density, radius + 3*width, lambda dx, dy, angle: np.exp(-(np.hypot(dx, dy) - radius)**2/(2*width**2)), seed)
+
+
+def janusEllipsoids(frames, size, density, a=8.0, b=4.0, contrast=0.5, seed=0):
+    # Elongated ellipsoids with semi-axes a and b where one half is darker by contrast (Janus particles),
+    # e.g. for the Ellipsoid-Tracker and Janus-Particles modules
+    def shape(dx, dy, angle):
+        u = dx*np.cos(angle) + dy*np.sin(angle)
+        v = -dx*np.sin(angle) + dy*np.cos(angle)
+        inside = 1/(1 + np.exp(4*(np.sqrt((u/a)**2 + (v/b)**2) - 1)))
+        return inside*np.where(u > 0, 1, 1 - contrast)
+    return render(frames, size, density, a + 2, shape, seed, orientations=True)
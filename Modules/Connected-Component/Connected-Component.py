@@ -8,7 +8,6 @@ Data:        20/01/20
 
 import numpy as np
 
-import skimage
 import pandas as pd
 
 import os
@@ -21,6 +20,7 @@ import pyqtgraph as pg
 
 from ..Utils import pgutils
 from ..Utils.settings import saveSettings, restoreSettings
+from .kernel import Parameters, thresholdImages, findFeaturesBatch
 
 
 class Module(QtWidgets.QWidget):
@@ -32,6 +32,7 @@ class Module(QtWidgets.QWidget):
         
         loadUi(os.path.splitext(os.path.relpath(__file__))[0] + '.ui', self)
         self.settingsFile = os.path.splitext(os.path.relpath(__file__))[0] + '.ini'
+        self.computeOnly = False # set during the batch processing
         
         self.thresholdSpinBox.valueChanged.connect(self.updated.emit)  
         self.minAreaSpinBox.valueChanged.connect(self.updated.emit)  
@@ -53,47 +54,22 @@ class Module(QtWidgets.QWidget):
         saveSettings(self.settingsFile, self.widget)
         
 
+    def parameters(self):
+        return Parameters(threshold=self.thresholdSpinBox.value(),
+                          invert=bool(self.invertCheckBox.checkState()),
+                          minArea=self.minAreaSpinBox.value(),
+                          maxArea=self.maxAreaSpinBox.value(),
+                          maxFeatures=self.maxFeaturesSpinBox.value())
+
     def findFeatures(self, frame, imageItem):
             
-        threshold = self.thresholdSpinBox.value()
-        min_area = self.minAreaSpinBox.value()
-        max_area = self.maxAreaSpinBox.value()
-        max_features = self.maxFeaturesSpinBox.value()
-        invert = self.invertCheckBox.checkState()
+        parameters = self.parameters()
+        features = findFeaturesBatch(imageItem.image[np.newaxis], parameters, [frame]).toDataFrame()
 
-        features = pd.DataFrame()           
-        intensityImage = imageItem.image
-        thresholdImage = (intensityImage > threshold).astype(int) # Threshold image
-        if invert:
-            thresholdImage = 1 - thresholdImage
-        labelImage = skimage.measure.label(thresholdImage)
-        regions = skimage.measure.regionprops(label_image = labelImage, intensity_image = intensityImage) # http://scikit-image.org/docs/dev/api/skimage.measure.html
-        j = 0
-        for region in regions:
-            # Area filter first 
-            if region.area < min_area or region.area > max_area:  # Do not add feature
-                continue
-            if j >= max_features: # Do not add feature
-                continue 
-            features = features.append([{'y': region.centroid[0], 
-                                         'x': region.centroid[1],
-                                         'y_weighted': region.weighted_centroid[0],
-                                         'x_weighted': region.weighted_centroid[1],
-                                         'orientation': region.orientation,
-                                         'minor_axis_length': region.minor_axis_length,
-                                         'major_axis_length': region.major_axis_length,
-                                         'eccentricity': region.eccentricity,
-                                         'area': region.area,
-                                         'equivalent_diameter': region.equivalent_diameter,
-                                         'filled_area': region.filled_area,
-                                         'max_intensity': region.max_intensity,
-                                         'mean_intensity': region.mean_intensity,
-                                         #'bbox': region.bbox,
-                                         'frame': frame,}])
-            j += 1 # Feature added
-        features.reset_index(drop=True, inplace = True)
+        if self.computeOnly: # batch processing, no image, overlay and feature count updates
+            return features
         
-        imageItem.setImage(thresholdImage)
+        imageItem.setImage(thresholdImages(imageItem.image[np.newaxis], parameters)[0])
         
         # Overlay
         for item in self.items:
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of Connected-Component Labeling without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+import skimage
+
+from ..Utils.features import FeatureBuffer
+
+
+properties = ['centroid', 'weighted_centroid', 'orientation', 'minor_axis_length', 'major_axis_length', 'eccentricity', 
+              'area', 'equivalent_diameter', 'filled_area', 'max_intensity', 'mean_intensity']
+
+
+class Parameters:
+    # Parameters of the detection, i.e. the values of the input widgets
+
+    def __init__(self, threshold=1000, invert=False, minArea=10, maxArea=250, maxFeatures=100):
+        self.threshold = threshold
+        self.invert = invert
+        self.minArea = minArea
+        self.maxArea = maxArea
+        self.maxFeatures = maxFeatures
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        return cls(threshold=values['thresholdSpinBox'], invert=bool(values['invertCheckBox']), minArea=values['minAreaSpinBox'],
+                   maxArea=values['maxAreaSpinBox'], maxFeatures=values['maxFeaturesSpinBox'])
+
+
+def thresholdImages(images, parameters):
+    # Threshold images of a stack of frames (N, H, W)
+    binaryImages = (images > parameters.threshold).astype(int)
+    if parameters.invert:
+        binaryImages = 1 - binaryImages
+    return binaryImages
+
+
+def regionFeatures(thresholdImage, intensityImage, frame, parameters):
+    # Features of the connected components of a threshold image as columns {name: array}
+    labelImage = skimage.measure.label(thresholdImage)
+    regions = skimage.measure.regionprops_table(labelImage, intensityImage, properties=properties) # http://scikit-image.org/docs/dev/api/skimage.measure.html
+    valid = (regions['area'] >= parameters.minArea) & (regions['area'] <= parameters.maxArea) # area filter first
+    valid &= np.cumsum(valid) <= parameters.maxFeatures
+    return {'y': regions['centroid-0'][valid], 
+            'x': regions['centroid-1'][valid],
+            'y_weighted': regions['weighted_centroid-0'][valid],
+            'x_weighted': regions['weighted_centroid-1'][valid],
+            'orientation': regions['orientation'][valid],
+            'minor_axis_length': regions['minor_axis_length'][valid],
+            'major_axis_length': regions['major_axis_length'][valid],
+            'eccentricity': regions['eccentricity'][valid],
+            'area': regions['area'][valid],
+            'equivalent_diameter': regions['equivalent_diameter'][valid],
+            'filled_area': regions['filled_area'][valid],
+            'max_intensity': regions['max_intensity'][valid],
+            'mean_intensity': regions['mean_intensity'][valid],
+            'frame': np.full(np.count_nonzero(valid), frame)}
+
+
+def findFeaturesBatch(images, parameters, frames):
+    # Detection without the GUI on a stack of frames (N, H, W) with the frame numbers frames. The features
+    # are returned as FeatureBuffer, e.g. findFeaturesBatch(images, Parameters(threshold=500), range(len(images))).toDataFrame()
+    features = FeatureBuffer()
+    for thresholdImage, intensityImage, frame in zip(thresholdImages(images, parameters), images, frames):
+        features.extend(regionFeatures(thresholdImage, intensityImage, frame, parameters))
+    return features
@@ -7,7 +7,6 @@ Date:        18/09/18
 
 import numpy as np
 
-from skimage.feature import blob_dog
 import pandas as pd
 
 import os
@@ -19,6 +18,7 @@ import pyqtgraph as pg
 
 from ..Utils import pgutils
 from ..Utils.settings import saveSettings, restoreSettings
+from .kernel import Parameters, findFeaturesBatch
 
 
 class Module(QtWidgets.QWidget):
@@ -30,6 +30,7 @@ class Module(QtWidgets.QWidget):
         
         loadUi(os.path.splitext(os.path.relpath(__file__))[0] + '.ui', self)
         self.settingsFile = os.path.splitext(os.path.relpath(__file__))[0] + '.ini'
+        self.computeOnly = False # set during the batch processing
         
         self.thresholdSpinBox.valueChanged.connect(self.updated.emit)
         self.maxSigmaSpinBox.valueChanged.connect(self.updated.emit)
@@ -48,26 +49,17 @@ class Module(QtWidgets.QWidget):
         saveSettings(self.settingsFile, self.widget)
        
 
+    def parameters(self):
+        return Parameters(threshold=self.thresholdSpinBox.value(), maxSigma=self.maxSigmaSpinBox.value())
+
     def findFeatures(self, frame, imageItem):
         
-        threshold = self.thresholdSpinBox.value()
-        maxSigma = self.maxSigmaSpinBox.value()
+        features = findFeaturesBatch(imageItem.image[np.newaxis], self.parameters(), [frame]).toDataFrame()
 
-        image = imageItem.image
-        mlist = blob_dog(image/image.max(), max_sigma=maxSigma, threshold=threshold/100)
-        radii = mlist[:, 2]*np.sqrt(2)
-    
-        features = pd.DataFrame()
-        x, y = np.meshgrid(np.arange(0, image.shape[1], 1), np.arange(0, image.shape[0], 1))
-        if mlist.size > 0:
-            for j in range(mlist.shape[0]):
-                mask = (((x - mlist[j, 1])**2 + (y - mlist[j, 0])**2) < (mlist[j, 2]*np.sqrt(2))**2).astype(int)
-                features = features.append([{'y': mlist[j, 0],
-                                             'x': mlist[j, 1],
-                                             'max_intensity': image[mask==1].max(),
-                                             'mean_intenity': image[mask==1].mean(),
-                                             'area': 2*np.pi*mlist[j, 2]**2,
-                                             'frame': frame,}])
+        if self.computeOnly: # batch processing, no image, overlay and feature count updates
+            return features
+        
+        radii = np.sqrt(features.area.values/np.pi) if features.size > 0 else [] # area = 2*pi*sigma**2, radius = sqrt(2)*sigma
         
         #imageItem.setImage(image)
         
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of the Difference of Gaussians (DoG) blob detection without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+from skimage.feature import blob_dog
+
+from ..Utils.features import FeatureBuffer
+
+
+class Parameters:
+    # Parameters of the detection, i.e. the values of the input widgets
+
+    def __init__(self, threshold=10, maxSigma=5):
+        self.threshold = threshold # in % of the maximum intensity
+        self.maxSigma = maxSigma
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        return cls(threshold=values['thresholdSpinBox'], maxSigma=values['maxSigmaSpinBox'])
+
+
+def blobFeatures(image, frame, parameters):
+    # Features of the blobs of an image as columns {name: array}
+    mlist = blob_dog(image/image.max(), max_sigma=parameters.maxSigma, threshold=parameters.threshold/100)
+    radii = mlist[:, 2]*np.sqrt(2)
+    maxIntensity = np.empty(len(mlist))
+    meanIntensity = np.empty(len(mlist))
+    for j in range(len(mlist)):
+        # Only the pixels of the bounding box of the circle
+        y0, x0 = max(int(np.floor(mlist[j, 0] - radii[j])), 0), max(int(np.floor(mlist[j, 1] - radii[j])), 0)
+        y1, x1 = int(np.ceil(mlist[j, 0] + radii[j])) + 1, int(np.ceil(mlist[j, 1] + radii[j])) + 1
+        x, y = np.meshgrid(np.arange(x0, min(x1, image.shape[1]), 1), np.arange(y0, min(y1, image.shape[0]), 1))
+        mask = ((x - mlist[j, 1])**2 + (y - mlist[j, 0])**2) < radii[j]**2
+        pixels = image[y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]][mask]
+        maxIntensity[j] = pixels.max()
+        meanIntensity[j] = pixels.mean()
+    return {'y': mlist[:, 0],
+            'x': mlist[:, 1],
+            'max_intensity': maxIntensity,
+            'mean_intenity': meanIntensity,
+            'area': 2*np.pi*mlist[:, 2]**2,
+            'frame': np.full(len(mlist), frame)}
+
+
+def findFeaturesBatch(images, parameters, frames):
+    # Detection without the GUI on a stack of frames (N, H, W) with the frame numbers frames. The features
+    # are returned as FeatureBuffer, e.g. findFeaturesBatch(images, Parameters(threshold=10), range(len(images))).toDataFrame()
+    features = FeatureBuffer()
+    for image, frame in zip(images, frames):
+        features.extend(blobFeatures(image, frame, parameters))
+    return features
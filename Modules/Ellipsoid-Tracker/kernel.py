@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of the Ellipsoid-Tracker without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl, Nicola Söker
+Data:        18/10/26
+"""
+
+import numpy as np
+
+import skimage
+
+from ..Utils.features import FeatureBuffer
+
+
+class Parameters:
+    # Parameters of the detection, i.e. the values of the input widgets
+
+    def __init__(self, threshold=1000, invert=False, minArea=10, maxArea=250, maxFeatures=100):
+        self.threshold = threshold
+        self.invert = invert
+        self.minArea = minArea
+        self.maxArea = maxArea
+        self.maxFeatures = maxFeatures
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        return cls(threshold=values['thresholdSpinBox'], invert=bool(values['invertCheckBox']), minArea=values['minAreaSpinBox'],
+                   maxArea=values['maxAreaSpinBox'], maxFeatures=values['maxFeaturesSpinBox'])
+
+
+def thresholdImages(images, parameters):
+    # Threshold images of a stack of frames (N, H, W)
+    binaryImages = (images > parameters.threshold).astype(int)
+    if parameters.invert:
+        binaryImages = 1 - binaryImages
+    return binaryImages
+
+
+def ellipsoidFeatures(thresholdImage, intensityImage, frame, parameters, features):
+    # Append the features of the ellipsoids in a threshold image to the FeatureBuffer features
+    labelImage = skimage.measure.label(thresholdImage)
+    regions = skimage.measure.regionprops(label_image = labelImage, intensity_image = intensityImage) # http://scikit-image.org/docs/dev/api/skimage.measure.html
+    j = 0
+    for region in regions:
+        # Area filter first 
+        if region.area < parameters.minArea or region.area > parameters.maxArea:  # Do not add feature
+            continue
+        if j >= parameters.maxFeatures: # Do not add feature
+            continue 
+        x_com = region.local_centroid[1]
+        y_com = region.local_centroid[0]
+        intensity_image = region.intensity_image
+        orientation = -region.orientation # the minus sign here is necassary for x = cos(phi) and y = sin(phi) to be true
+        L = region.major_axis_length
+
+        min_row, min_col, max_row, max_col = region.bbox
+        w = max_col - min_col
+        h = max_row - min_row
+
+        x_list = np.linspace(0,w-1,w) - x_com
+        y_list = np.linspace(0,h-1,h) - y_com
+
+        x_matrix, y_matrix = np.meshgrid(x_list, y_list)
+
+        x_matrix_particle_frame = x_matrix*np.cos(-orientation + np.pi/2) - y_matrix*np.sin(-orientation + np.pi/2)
+        y_matrix_particle_frame = x_matrix*np.sin(-orientation + np.pi/2) + y_matrix*np.cos(-orientation + np.pi/2)
+            
+        weight_matrix = np.cos( x_matrix_particle_frame / (L/4) )
+        weight_matrix[y_matrix_particle_frame < 0] = - weight_matrix[y_matrix_particle_frame < 0]
+
+        direction_measure = np.mean( weight_matrix*intensity_image, axis = (0, 1) )
+
+        features.append({'y': region.centroid[0], 
+                         'x': region.centroid[1],
+                         'y_weighted': region.weighted_centroid[0],
+                         'x_weighted': region.weighted_centroid[1],
+                         'orientation': -region.orientation,  # the minus sign here is necassary for x = cos(phi) and y = sin(phi) to be true
+                         'minor_axis_length': region.minor_axis_length,
+                         'major_axis_length': region.major_axis_length,
+                         'eccentricity': region.eccentricity,
+                         'area': region.area,
+                         'equivalent_diameter': region.equivalent_diameter,
+                         'filled_area': region.filled_area,
+                         'max_intensity': region.max_intensity,
+                         'mean_intensity': region.mean_intensity,
+                         'direction_measure': direction_measure,
+                         #'weights_matrix': weight_matrix,
+                         #'x_matrix_particle_frame': x_matrix_particle_frame,
+                         #'y_matrix_particle_frame': y_matrix_particle_frame,
+                         #'x_matrix': x_matrix,
+                         #'y_matrix': y_matrix,
+                         #'intensity_matrix': intensity_image,
+                         #'h_image': h,
+                         #'w_image': w,
+                         #'x_com': x_com,
+                         #'y_com': y_com,
+                         #'bbox': region.bbox,
+                         'frame': frame,})
+        j += 1 # Feature added
+
+
+def findFeaturesBatch(images, parameters, frames):
+    # Detection without the GUI on a stack of frames (N, H, W) with the frame numbers frames. The features
+    # are returned as FeatureBuffer, e.g. findFeaturesBatch(images, Parameters(threshold=500), range(len(images))).toDataFrame()
+    features = FeatureBuffer()
+    for thresholdImage, intensityImage, frame in zip(thresholdImages(images, parameters), images, frames):
+        ellipsoidFeatures(thresholdImage, intensityImage, frame, parameters, features)
+    return features
@@ -7,8 +7,6 @@ Date:        18/09/18
 
 import numpy as np
 
-from skimage.transform import hough_circle, hough_circle_peaks
-from skimage.feature import canny
 import pandas as pd
 
 import os
@@ -20,6 +18,8 @@ import pyqtgraph as pg
 
 from ..Utils import pgutils
 from ..Utils.settings import saveSettings, restoreSettings
+from ..Utils.features import FeatureBuffer
+from .kernel import Parameters, edgeImage, circleFeatures
 
 
 class Module(QtWidgets.QWidget):
@@ -31,6 +31,7 @@ class Module(QtWidgets.QWidget):
         
         loadUi(os.path.splitext(os.path.relpath(__file__))[0] + '.ui', self)
         self.settingsFile = os.path.splitext(os.path.relpath(__file__))[0] + '.ini'
+        self.computeOnly = False # set during the batch processing
         
         self.sigmaSpinBox.valueChanged.connect(self.updated.emit)
         self.minRadiusSpinBox.valueChanged.connect(self.updated.emit)
@@ -54,29 +55,22 @@ class Module(QtWidgets.QWidget):
         saveSettings(self.settingsFile, self.widget)
        
 
+    def parameters(self):
+        return Parameters(sigma=self.sigmaSpinBox.value(),
+                          minRadius=self.minRadiusSpinBox.value(),
+                          maxRadius=self.maxRadiusSpinBox.value(),
+                          threshold=self.thresholdSpinBox.value())
+
     def findFeatures(self, frame, imageItem):
                 
-        sigma = self.sigmaSpinBox.value()
-        min_radius = self.minRadiusSpinBox.value()
-        max_radius = self.maxRadiusSpinBox.value()
-        threshold = self.thresholdSpinBox.value()
-        
-        image = imageItem.image
-        
-        edges = canny(image, sigma=sigma) # , low_threshold=80, high_threshold=150
-        hough_radii = np.arange(min_radius, max_radius, 1) # np.linspace(20, 45, 50) 
-        hough_transform = hough_circle(edges, hough_radii)
+        parameters = self.parameters()
+        edges = edgeImage(imageItem.image, parameters)
+        features = FeatureBuffer()
+        features.extend(circleFeatures(edges, frame, parameters))
+        features = features.toDataFrame()
 
-        # Select the most prominent circles
-        _, x_centers, y_centers, radii = hough_circle_peaks(hough_transform, hough_radii, threshold=threshold)  
-        
-        features = pd.DataFrame()
-        for x, y, r in zip(x_centers, y_centers, radii):
-             features = features.append([{'x': x,
-                                          'y': y,
-                                          #'max_intensity': image[mask==1].max(),
-                                          'radius': r,
-                                          'frame': frame,}])
+        if self.computeOnly: # batch processing, no image, overlay and feature count updates
+            return features
         
         if self.showProcessedCheckBox.checkState():
             imageItem.setImage(edges.astype('int'))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of the Hough transform without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+from skimage.transform import hough_circle, hough_circle_peaks
+from skimage.feature import canny
+
+from ..Utils.features import FeatureBuffer
+
+
+class Parameters:
+    # Parameters of the detection, i.e. the values of the input widgets
+
+    def __init__(self, sigma=3.0, minRadius=5, maxRadius=30, threshold=0.5):
+        self.sigma = sigma
+        self.minRadius = minRadius
+        self.maxRadius = maxRadius
+        self.threshold = threshold
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        return cls(sigma=values['sigmaSpinBox'], minRadius=values['minRadiusSpinBox'], maxRadius=values['maxRadiusSpinBox'],
+                   threshold=values['thresholdSpinBox'])
+
+
+def edgeImage(image, parameters):
+    return canny(image, sigma=parameters.sigma) # , low_threshold=80, high_threshold=150
+
+
+def circleFeatures(edges, frame, parameters):
+    # Features of the circles in an edge image as columns {name: array}
+    hough_radii = np.arange(parameters.minRadius, parameters.maxRadius, 1) # np.linspace(20, 45, 50) 
+    hough_transform = hough_circle(edges, hough_radii)
+
+    # Select the most prominent circles
+    _, x_centers, y_centers, radii = hough_circle_peaks(hough_transform, hough_radii, threshold=parameters.threshold)  
+    return {'x': x_centers,
+            'y': y_centers,
+            'radius': radii,
+            'frame': np.full(len(radii), frame)}
+
+
+def findFeaturesBatch(images, parameters, frames):
+    # Detection without the GUI on a stack of frames (N, H, W) with the frame numbers frames. The features
+    # are returned as FeatureBuffer, e.g. findFeaturesBatch(images, Parameters(minRadius=5), range(len(images))).toDataFrame()
+    features = FeatureBuffer()
+    for image, frame in zip(images, frames):
+        features.extend(circleFeatures(edgeImage(image, parameters), frame, parameters))
+    return features
@@ -7,7 +7,6 @@ Data:        28/01/20
 
 import numpy as np
 
-from skimage.feature import blob_dog
 import pandas as pd
 
 import os
@@ -17,6 +16,7 @@ from PyQt5 import QtWidgets
 import pyqtgraph as pg
 
 from .utils import drawOverlay, ini
+from .kernel import Parameters, findFeaturesBatch
 
 
 class Module(QtWidgets.QWidget):
@@ -29,6 +29,7 @@ class Module(QtWidgets.QWidget):
         moduleName = os.path.splitext(os.path.basename(__file__))[0] # The module name is defined by the nam of this file 
         loadUi('Modules/' + moduleName + '.ui', self) # Load the *.ui file with the same filename
         self.iniFile = 'Modules/' + moduleName + '.ini' # Define the filename for the *.ini file 
+        self.computeOnly = False # Set by the main application during the batch processing
         
         # Connect the input widgets events to the "updated" event of the module. The widget names are defined in the *.ui file.
         self.thresholdSpinBox.valueChanged.connect(self.updated.emit)
@@ -46,31 +47,22 @@ class Module(QtWidgets.QWidget):
         self.p.removeItem(self.pc) # Remove the overlay
         ini.saveSettings(self.iniFile, self.widget) # Save stettings to the *.ini file 
        
-    # This function is responsible of the actual feature detection.
-    # It requires the frame number and an ImageItem as input parameters and needs to return a Pandas DataFrame
+    # Get the values from the input widgets as Parameters object
+    def parameters(self):
+        return Parameters(threshold=self.thresholdSpinBox.value(), maxSigma=self.maxSigmaSpinBox.value())
+
+    # This function is called by the main application for every frame.
+    # It requires the frame number and an ImageItem as input parameters and needs to return a Pandas DataFrame.
+    # The actual feature detection is done by findFeaturesBatch() of the kernel.py with a stack of one frame.
     def findFeatures(self, frame, imageItem):
         
-        # Get values from the input widgets
-        threshold = self.thresholdSpinBox.value()
-        maxSigma = self.maxSigmaSpinBox.value()
-
         # Get the image array from the ImageItem
         image = imageItem.image
-        # Detected features in the image. Here we use the Difference of Gaussian (DoG) algorithm provided with the "skimage" package.
-        mlist = blob_dog(image/image.max(), max_sigma=maxSigma, threshold=threshold/100)
-        radii = mlist[:, 2]*np.sqrt(2)
-    
-        # Save the detected features as Pandas DataFrame
-        features = pd.DataFrame()
-        x, y = np.meshgrid(np.arange(0, image.shape[0], 1), np.arange(0, image.shape[1], 1))
-        if mlist.size > 0:
-            for j in range(mlist.shape[0]):
-                mask = (((x - mlist[j, 1])**2 + (y - mlist[j, 0])**2) < (mlist[j, 2]*np.sqrt(2))**2).astype(int)
-                features = features.append([{'y': mlist[j, 0],
-                                             'x': mlist[j, 1],
-                                             'max_intensity': image[mask==1].max(),
-                                             'area': 2*np.pi*mlist[j, 2]**2,
-                                             'frame': frame,}])
+        features = findFeaturesBatch(image[np.newaxis], self.parameters(), [frame]).toDataFrame()
+        radii = np.sqrt(features.area.values/np.pi) if features.size > 0 else [] # Radii of the features for the overlay
+
+        if self.computeOnly: # During the batch processing, only the features are required (no output image, overlay and number of features)
+            return features
         
         # Set the output image as image of the ImageItem (Here, the output image is the same as the input image)
         imageItem.setImage(image)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of the Template module without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+from skimage.feature import blob_dog
+
+from ..Utils.features import FeatureBuffer # Do not import PyQt5 or pyqtgraph in the kernel, the batch processing imports it without GUI
+
+
+# The parameters of the detection, i.e. the values of the input widgets. The detection does not depend on the GUI,
+# e.g. it can be used in scripts or by the batch processing.
+class Parameters:
+
+    def __init__(self, threshold=10, maxSigma=5):
+        self.threshold = threshold
+        self.maxSigma = maxSigma
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        return cls(threshold=values['thresholdSpinBox'], maxSigma=values['maxSigmaSpinBox'])
+
+
+# This function is responsible of the actual feature detection. It requires a stack of frames (N, H, W), the 
+# parameters and the frame numbers of the frames and returns the features as FeatureBuffer. Modules can
+# process all frames at once, e.g. with NumPy operations on the whole stack.
+def findFeaturesBatch(images, parameters, frames):
+    
+    # Collect the detected features in a FeatureBuffer. Columns {name: array} (e.g. all features of a frame) are added with extend()
+    features = FeatureBuffer()
+    for image, frame in zip(images, frames):
+        # Detected features in the image. Here we use the Difference of Gaussian (DoG) algorithm provided with the "skimage" package.
+        mlist = blob_dog(image/image.max(), max_sigma=parameters.maxSigma, threshold=parameters.threshold/100)
+        radii = mlist[:, 2]*np.sqrt(2)
+        maxIntensity = np.empty(len(mlist))
+        x, y = np.meshgrid(np.arange(0, image.shape[1], 1), np.arange(0, image.shape[0], 1))
+        for j in range(len(mlist)):
+            mask = ((x - mlist[j, 1])**2 + (y - mlist[j, 0])**2) < radii[j]**2
+            maxIntensity[j] = image[mask].max()
+        features.extend({'y': mlist[:, 0],
+                         'x': mlist[:, 1],
+                         'max_intensity': maxIntensity,
+                         'area': 2*np.pi*mlist[:, 2]**2,
+                         'frame': np.full(len(mlist), frame)})
+        
+    return features
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+
+class FeatureBuffer:
+    # Columnar accumulator for features. The values are written into preallocated NumPy arrays per column
+    # which grow in chunks, i.e. appending is linear in the number of features. The DataFrame is only built
+    # once by toDataFrame(). Replaces DataFrame.append() which is quadratic and removed in pandas 2.
+
+    def __init__(self, capacity=256, maxCapacity=65536):
+        self.capacity = capacity
+        self.maxCapacity = maxCapacity
+        self.chunks = [] # full chunks as (rows, {name: array})
+        self.columns = {} # arrays of the current chunk
+        self.rows = 0 # rows in the current chunk
+        self.names = [] # all column names in the order of appearance
+
+    def __len__(self):
+        return sum(rows for rows, _ in self.chunks) + self.rows
+
+    def newColumn(self, name, value):
+        if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)):
+            column = np.empty(self.capacity, dtype=object)
+            column[:self.rows] = None
+        elif isinstance(value, (int, np.integer)):
+            column = np.zeros(self.capacity, dtype=np.int64)
+        else:
+            column = np.full(self.capacity, np.nan)
+        if name not in self.names:
+            self.names.append(name)
+        return column
+
+    def flush(self):
+        # Move the current chunk to the chunk list, the next chunk is twice as large
+        if self.rows:
+            self.chunks.append((self.rows, {name: column[:self.rows] for name, column in self.columns.items()}))
+        self.columns = {}
+        self.rows = 0
+        self.capacity = min(2*self.capacity, self.maxCapacity)
+
+    def append(self, feature):
+        # Append a single feature given as dict, e.g. {'x': 1.0, 'y': 2.0, 'frame': 0}
+        if self.rows == self.capacity:
+            self.flush()
+        for name, value in feature.items():
+            column = self.columns.get(name)
+            if column is None:
+                column = self.newColumn(name, value)
+                if self.rows and column.dtype == np.int64: # missing values in previous rows
+                    column = column.astype(float)
+                    column[:self.rows] = np.nan
+                self.columns[name] = column
+            elif column.dtype == np.int64 and not isinstance(value, (int, np.integer)):
+                column = self.columns[name] = column.astype(float if isinstance(value, (float, np.floating)) else object)
+            column[self.rows] = value
+        if len(feature) < len(self.columns):
+            for name, column in self.columns.items():
+                if name not in feature:
+                    if column.dtype == np.int64:
+                        column = self.columns[name] = column.astype(float)
+                    column[self.rows] = np.nan if column.dtype != object else None
+        self.rows += 1
+
+    def extend(self, features):
+        # Append a block of features given as DataFrame, FeatureBuffer or dict of equally long arrays
+        if isinstance(features, FeatureBuffer):
+            features.flush()
+            chunks = features.chunks
+        else:
+            if isinstance(features, pd.DataFrame):
+                columns = {name: features[name].values for name in features.columns}
+            else:
+                columns = {name: np.asarray(values) for name, values in features.items()}
+            rows = len(next(iter(columns.values()))) if columns else 0
+            chunks = [(rows, columns)]
+        capacity = self.capacity
+        self.flush()
+        self.capacity = capacity
+        for rows, columns in chunks:
+            if rows:
+                self.chunks.append((rows, columns))
+                for name in columns:
+                    if name not in self.names:
+                        self.names.append(name)
+
+    def toDataFrame(self):
+        self.flush()
+        if not self.chunks:
+            return pd.DataFrame()
+        data = {}
+        for name in self.names:
+            pieces = [columns[name] if name in columns else np.full(rows, np.nan) for rows, columns in self.chunks]
+            data[name] = np.concatenate(pieces) if len(pieces) > 1 else pieces[0]
+        return pd.DataFrame(data, columns=self.names)
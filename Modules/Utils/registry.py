@@ -0,0 +1,159 @@
+"""
+Discription: Registry of the modules and their detection kernels. The modules are the directories in
+             Modules (except Utils and Template). A module with a kernel.py provides its detection without
+             Qt, i.e. the kernel can be imported cheaply, e.g. in worker processes. The values of the input
+             widgets are read from the *.ui file (defaults) and the *.ini file (values last used in the GUI)
+             without Qt, as restoreSettings() and setParameters() do with the widgets.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import sys
+import time
+import importlib
+import subprocess
+import configparser
+import xml.etree.ElementTree as ElementTree
+
+
+modulesDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Ranges and decimals of the Qt spin boxes if not set in the *.ui file
+spinBoxDefaults = {'QSpinBox': (0, 99, 0), 'QDoubleSpinBox': (0.0, 99.99, 2)}
+
+# Parameters of the kernels which are files loaded in the GUI instead of input widgets, e.g. the *.pb file of YOLO
+fileParameters = ['modelFile']
+
+
+def moduleNames():
+    # Module directories in the order of os.listdir() as listed in the modulesComboBox
+    return [name for name in os.listdir(modulesDir) if os.path.isdir(os.path.join(modulesDir, name)) and name not in ['Utils', 'Template', '__pycache__']]
+
+
+importTimes = {} # module name: duration of the import in s
+
+
+def loadModule(moduleName):
+    # Import the module (Modules/<Name>/<Name>.py, requires PyQt5), the duration of the first import is
+    # recorded in importTimes
+    t0 = time.perf_counter()
+    module = importlib.import_module('Modules.' + moduleName + '.' + moduleName)
+    importTimes.setdefault(moduleName, time.perf_counter() - t0)
+    return module
+
+
+def importReport(names=None, timeout=120):
+    # Import time of each module in a new Python process in s (None if the import failed). The packages
+    # shared by all modules (PyQt5, pyqtgraph, NumPy, pandas, scikit-image) are imported before, i.e. the
+    # time is the cost of the module itself, e.g. of TensorFlow for YOLO.
+    script = ('import sys, time, importlib\n'
+              'sys.path.insert(0, %r)\n'
+              'for name in ["PyQt5.QtWidgets", "PyQt5.uic", "pyqtgraph", "numpy", "pandas", "skimage.measure", "Modules.Utils.features"]:\n'
+              '    try: importlib.import_module(name)\n'
+              '    except ImportError: pass\n'
+              't0 = time.perf_counter()\n'
+              'importlib.import_module(sys.argv[1])\n'
+              'print(time.perf_counter() - t0)\n') % os.path.dirname(modulesDir)
+    report = {}
+    for moduleName in names or moduleNames():
+        report[moduleName] = {}
+        for part, name in [('module', 'Modules.%s.%s' % (moduleName, moduleName)), ('kernel', 'Modules.%s.kernel' % moduleName)]:
+            if part == 'kernel' and not hasKernel(moduleName):
+                continue
+            try:
+                result = subprocess.run([sys.executable, '-c', script, name], capture_output=True, text=True, timeout=timeout)
+                report[moduleName][part] = float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else None
+            except (subprocess.SubprocessError, ValueError, IndexError):
+                report[moduleName][part] = None
+    return report
+
+
+def hasKernel(moduleName):
+    return os.path.isfile(os.path.join(modulesDir, moduleName, 'kernel.py'))
+
+
+def kernelNames():
+    return [name for name in moduleNames() if hasKernel(name)]
+
+
+def loadKernel(moduleName):
+    # The kernel module, e.g. loadKernel('Connected-Component').findFeaturesBatch(images, parameters, frames)
+    if not hasKernel(moduleName):
+        raise ValueError('Module "' + moduleName + '" has no kernel')
+    return importlib.import_module('Modules.' + moduleName + '.kernel')
+
+
+def uiWidgets(moduleName):
+    # {name: (class name, default value, minimum, maximum, decimals)} of the spin boxes and check boxes in the *.ui file
+    widgets = {}
+    tree = ElementTree.parse(os.path.join(modulesDir, moduleName, moduleName + '.ui'))
+    for widget in tree.iter('widget'):
+        className = widget.get('class')
+        if className not in ['QSpinBox', 'QDoubleSpinBox', 'QCheckBox']:
+            continue
+        properties = {p.get('name'): p[0].text for p in widget.findall('property') if len(p)}
+        if className == 'QCheckBox':
+            widgets[widget.get('name')] = (className, 2 if properties.get('checked') == 'true' else 0, None, None, None)
+            continue
+        number = int if className == 'QSpinBox' else float
+        minimum, maximum, decimals = spinBoxDefaults[className]
+        minimum = number(properties.get('minimum', minimum))
+        maximum = number(properties.get('maximum', maximum))
+        decimals = int(properties.get('decimals', decimals))
+        value = min(max(number(properties.get('value', minimum)), minimum), maximum)
+        widgets[widget.get('name')] = (className, value, minimum, maximum, decimals)
+    return widgets
+
+
+def convertValue(widget, value):
+    # Value as set by setValue()/setCheckState() of the widget, i.e. clipped to the range of spin boxes
+    className, _, minimum, maximum, decimals = widget
+    if className == 'QCheckBox':
+        if str(value).lower() in ['true', 'on']:
+            return 2
+        if str(value).lower() in ['false', 'off']:
+            return 0
+        return int(value)
+    if className == 'QSpinBox':
+        return min(max(int(value), minimum), maximum)
+    return min(max(round(float(value), decimals), minimum), maximum)
+
+
+def widgetValues(moduleName, settingsFile=None, parameters=None):
+    # Values of the spin boxes and check boxes of a module: the defaults of the *.ui file, overwritten by the module
+    # INI file, the settingsFile and the parameters by widget name, e.g. {'thresholdSpinBox': 50}. The file parameters,
+    # e.g. {'modelFile': 'yolo.pb'}, are added with the absolute path.
+    widgets = uiWidgets(moduleName)
+    values = {name: widget[1] for name, widget in widgets.items()}
+    for file in [os.path.join(modulesDir, moduleName, moduleName + '.ini'), settingsFile]:
+        if not file or not os.path.isfile(file):
+            continue
+        config = configparser.ConfigParser(interpolation=None)
+        config.optionxform = str # the widget names are case sensitive
+        try:
+            config.read(file)
+            for name, value in (config['General'].items() if 'General' in config else []):
+                if name in widgets:
+                    values[name] = convertValue(widgets[name], value)
+        except (configparser.Error, ValueError):
+            print('Error loading ' + file + '.')
+    for name, value in (parameters or {}).items():
+        if name in fileParameters:
+            values[name] = os.path.abspath(value)
+            continue
+        if name not in widgets:
+            raise ValueError('Unknown parameter "' + name + '"')
+        values[name] = convertValue(widgets[name], value)
+    return values
+
+
+def isDisplayWidget(name):
+    # Check boxes of the display only, e.g. showOverlayCheckBox, which do not change the features
+    return name.startswith('show')
+
+
+def moduleParameters(moduleName, values):
+    # The detection parameters as returned by settings.moduleParameters() for the widgets, i.e. the values
+    # of the spin boxes, double spin boxes and check boxes without the display widgets
+    return {name: value for name, value in values.items() if not isDisplayWidget(name)}
@@ -1,6 +1,8 @@
 from PyQt5.QtCore import QSettings
 from PyQt5.QtWidgets import QWidget
 
+from .registry import isDisplayWidget
+
 
 def restoreSettings(fileName, widget):            
 
@@ -36,3 +38,35 @@ def saveSettings(filename, widget):
         #    settings.setValue(obj.objectName(), str(obj.text()))
 
 
+def moduleParameters(widget):
+    # Values of the spin boxes, double spin boxes and check boxes of a module without the display widgets, 
+    # e.g. for the metadata and the hash of the features files
+    parameters = {}
+    for obj in widget.findChildren(QWidget):
+        if isDisplayWidget(obj.objectName()):
+            continue
+        if obj.metaObject().className() in ['QSpinBox', 'QDoubleSpinBox']:
+            parameters[obj.objectName()] = obj.value()
+        if obj.metaObject().className() == 'QCheckBox':
+            parameters[obj.objectName()] = obj.checkState()
+    return parameters
+
+
+def setParameters(widget, parameters):
+    # Set the values of the input widgets of a module by their object names, e.g. {'thresholdSpinBox': 50}
+    for name, value in parameters.items():
+        obj = widget.findChild(QWidget, name)
+        if obj is None:
+            raise ValueError('Unknown parameter "' + name + '"')
+        if obj.metaObject().className() == 'QSpinBox':
+            obj.setValue(int(value))
+        elif obj.metaObject().className() == 'QDoubleSpinBox':
+            obj.setValue(float(value))
+        elif obj.metaObject().className() == 'QCheckBox':
+            if str(value).lower() in ['true', 'on']:
+                value = 2
+            elif str(value).lower() in ['false', 'off']:
+                value = 0
+            obj.setCheckState(int(value))
+        else:
+            raise ValueError('Parameter "' + name + '" is not a spin box or check box')
@@ -7,7 +7,6 @@ Date:        18/09/18
 
 import numpy as np
 
-from skimage.transform import resize
 import pandas as pd
 
 import os
@@ -22,12 +21,10 @@ try:
 except:
 	print('TensorFlow package not found. YOLO module will be is disabled.')
 	
-import configparser
-            
 from ..Utils import pgutils
 from ..Utils.settings import saveSettings, restoreSettings
+from .kernel import Parameters, findFeaturesBatch, loadModel
 
-from .utils import decode_output
 
 class Module(QtWidgets.QWidget):
 
@@ -38,6 +35,7 @@ class Module(QtWidgets.QWidget):
         
         loadUi(os.path.splitext(os.path.relpath(__file__))[0] + '.ui', self)
         self.settingsFile = os.path.splitext(os.path.relpath(__file__))[0] + '.ini'
+        self.computeOnly = False # set during the batch processing
         
         self.enabled = False
         self.objThresholdSpinBox.setEnabled(False)
@@ -62,31 +60,7 @@ class Module(QtWidgets.QWidget):
     def loadModel(self, modelPath):
         
         pbFile = modelPath
-        
-        # Import graph from *.pb file
-        gf = tf.gfile.FastGFile(pbFile, 'rb')
-        graph_def = tf.GraphDef()
-        graph_def.ParseFromString(gf.read()) # Parses a serialized binary message into the current message.
-        gf.close()
-        
-        # Import information specific to YOLO from *.ini file
-        iniFile = os.path.splitext(pbFile)[0] + '.ini'   
-        config = configparser.ConfigParser()
-        config.read(iniFile)   
-        section = config.sections()[0]
-        self.IMAGE_H = int(config[section]['IMAGE_H'])
-        self.IMAGE_W = int(config[section]['IMAGE_W'])
-        self.LABELS  = config[section]['LABELS'].split(',')
-        self.CLASSES = len(self.LABELS)
-        self.ANCHORS = [float(a) for a in config[section]['ANCHORS'].split(',')]
-        self.INPUT_NODE_NAME  = config[section]['INPUT_NODE_NAME']
-        self.OUTPUT_NODE_NAME = config[section]['OUTPUT_NODE_NAME']
-   
-        # Start TensorFlow session and import graph
-        self.session = tf.Session()
-        self.session.graph.as_default()
-        tf.import_graph_def(graph_def)
-        self.output_tensor = self.session.graph.get_tensor_by_name('import/' + self.OUTPUT_NODE_NAME + ':0')
+        loadModel(pbFile)
         
         # If no error ... 
         self.lineEdit.setText(pbFile)   
@@ -117,40 +91,19 @@ class Module(QtWidgets.QWidget):
         saveSettings(self.settingsFile, self.widget)
        
 
+    def parameters(self):
+        return Parameters(objThreshold=self.objThresholdSpinBox.value(),
+                          nmsThreshold=self.nmsThresholdSpinBox.value(),
+                          modelFile=self.lineEdit.text() if self.enabled else None)
+
     def findFeatures(self, frame, imageItem):
         
-        #threshold = self.thresholdSpinBox.value()
-        #maxSigma = self.maxSigmaSpinBox.value()
-        OBJ_THRESHOLD = self.objThresholdSpinBox.value()
-        NMS_THRESHOLD = self.nmsThresholdSpinBox.value()
-        
-        image = imageItem.image
-        dimx = image.shape[1]
-        dimy = image.shape[0]
-        
         features = pd.DataFrame()
         if self.enabled:
-            image = resize(image, (416, 416))
-            input_tensor = np.expand_dims(np.stack((image, image, image)/image.max(), axis=-1), 0) # reshape image to input tensor shape
-            output = self.session.run(self.output_tensor, {'import/' + self.INPUT_NODE_NAME + ':0': input_tensor}) # run model
-            bboxes = decode_output(output[0], self.ANCHORS, self.CLASSES, OBJ_THRESHOLD, NMS_THRESHOLD) # decode output tensor
-            
-            for bbox in bboxes:
-                xmin = bbox.xmin*dimx
-                ymin = bbox.ymin*dimy
-                xmax = bbox.xmax*dimx
-                ymax = bbox.ymax*dimy
-                class_idx = bbox.get_label()
-                features = features.append([{'x': 0.5*(xmin + xmax),
-                                             'y': 0.5*(ymin + ymax),
-                                             'xmin': xmin, 
-                                             'ymin': ymin,
-                                             'xmax': xmax,
-                                             'ymax': ymax,
-                                             'w': xmax - xmin,
-                                             'h': ymax - ymin,
-                                             'class_idx': class_idx,
-                                             'frame': frame,}])
+            features = findFeaturesBatch(imageItem.image[np.newaxis], self.parameters(), [frame]).toDataFrame()
+
+            if self.computeOnly: # batch processing, no image, overlay and feature count updates
+                return features
     
             for item in self.items:
                 self.p.removeItem(item)
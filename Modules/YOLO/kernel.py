@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Detection kernel of YOLO without Qt, i.e. it can be imported
+             and pickled in worker processes. Used by the module and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import numpy as np
+
+from skimage.transform import resize
+
+import os
+import configparser
+
+from ..Utils.features import FeatureBuffer
+
+from .utils import decode_output
+
+
+class Model:
+    # YOLO model loaded from a *.pb file with the information specific to YOLO in the *.ini file with the same name
+
+    def __init__(self, pbFile):
+        
+        import tensorflow as tf # only imported when a model is loaded
+        
+        # Import graph from *.pb file
+        gf = tf.gfile.FastGFile(pbFile, 'rb')
+        graph_def = tf.GraphDef()
+        graph_def.ParseFromString(gf.read()) # Parses a serialized binary message into the current message.
+        gf.close()
+        
+        # Import information specific to YOLO from *.ini file
+        iniFile = os.path.splitext(pbFile)[0] + '.ini'   
+        config = configparser.ConfigParser()
+        config.read(iniFile)   
+        section = config.sections()[0]
+        self.IMAGE_H = int(config[section]['IMAGE_H'])
+        self.IMAGE_W = int(config[section]['IMAGE_W'])
+        self.LABELS  = config[section]['LABELS'].split(',')
+        self.CLASSES = len(self.LABELS)
+        self.ANCHORS = [float(a) for a in config[section]['ANCHORS'].split(',')]
+        self.INPUT_NODE_NAME  = config[section]['INPUT_NODE_NAME']
+        self.OUTPUT_NODE_NAME = config[section]['OUTPUT_NODE_NAME']
+   
+        # Start TensorFlow session and import graph
+        self.session = tf.Session()
+        self.session.graph.as_default()
+        tf.import_graph_def(graph_def)
+        self.output_tensor = self.session.graph.get_tensor_by_name('import/' + self.OUTPUT_NODE_NAME + ':0')
+
+
+models = {} # *.pb file: Model loaded by this process
+
+
+def loadModel(pbFile):
+    if pbFile not in models:
+        models[pbFile] = Model(pbFile)
+    return models[pbFile]
+
+
+class Parameters:
+    # Parameters of the detection, i.e. the values of the input widgets and the *.pb file of the model. The
+    # model is loaded by the process running the detection, i.e. the parameters can be passed to worker processes.
+
+    def __init__(self, objThreshold=0.6, nmsThreshold=0.45, modelFile=None):
+        self.objThreshold = objThreshold
+        self.nmsThreshold = nmsThreshold
+        self.modelFile = modelFile
+
+    @classmethod
+    def fromWidgets(cls, values):
+        # Parameters from the values of the input widgets by name, e.g. registry.widgetValues(moduleName)
+        if not values.get('modelFile'):
+            raise ValueError('No YOLO model file (*.pb), e.g. --param modelFile=Modules/YOLO/Models/yolo.pb')
+        return cls(objThreshold=values['objThresholdSpinBox'], nmsThreshold=values['nmsThresholdSpinBox'], modelFile=values['modelFile'])
+
+
+def findFeaturesBatch(images, parameters, frames):
+    # Detection without the GUI on a stack of frames (N, H, W) with the frame numbers frames. All frames
+    # are passed to the model as one input tensor. The features are returned as FeatureBuffer.
+    features = FeatureBuffer()
+    if not parameters.modelFile:
+        raise ValueError('No YOLO model loaded, the *.pb file is set with the parameter modelFile')
+    if len(images) == 0:
+        return features
+    model = loadModel(parameters.modelFile)
+    dimx = images.shape[2]
+    dimy = images.shape[1]
+    input_tensor = np.stack([np.stack((image, image, image)/image.max(), axis=-1) for image in (resize(image, (416, 416)) for image in images)]) # reshape images to input tensor shape
+    output = model.session.run(model.output_tensor, {'import/' + model.INPUT_NODE_NAME + ':0': input_tensor}) # run model
+    for netout, frame in zip(output, frames):
+        bboxes = decode_output(netout, model.ANCHORS, model.CLASSES, parameters.objThreshold, parameters.nmsThreshold) # decode output tensor
+        for bbox in bboxes:
+            xmin = bbox.xmin*dimx
+            ymin = bbox.ymin*dimy
+            xmax = bbox.xmax*dimx
+            ymax = bbox.ymax*dimy
+            class_idx = bbox.get_label()
+            features.append({'x': 0.5*(xmin + xmax),
+                             'y': 0.5*(ymin + ymax),
+                             'xmin': xmin, 
+                             'ymin': ymin,
+                             'xmax': xmax,
+                             'ymax': ymax,
+                             'w': xmax - xmin,
+                             'h': ymax - ymin,
+                             'class_idx': class_idx,
+                             'frame': frame,})
+    return features
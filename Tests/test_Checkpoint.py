@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Tests of the checkpoint manifest of a batch run: a manifest is only resumed
+             with the same parameters, including the double spin box parameters.
+             Usage: python -m pytest Tests
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+
+from Utils import Preprocessing
+from Utils.Checkpoint import Checkpoint, parameterHash
+from Modules.Utils import registry
+
+
+def houghHash(**parameters):
+    settings = Preprocessing.Settings(binning=1, subtractMean=False, median=0, roi=None, mask=None, invert=False)
+    values = registry.widgetValues('Hough-Transform', parameters=dict({'sigmaSpinBox': 3, 'thresholdSpinBox': 0.5}, **parameters))
+    return parameterHash(settings, 'Hough-Transform', registry.moduleParameters('Hough-Transform', values), 'hdf5', '')
+
+
+def test_floatParameterChangesHash():
+    assert houghHash() == houghHash()
+    assert houghHash(sigmaSpinBox=1) != houghHash()
+    assert houghHash(thresholdSpinBox=0.9) != houghHash()
+
+
+def test_displayWidgetKeepsHash():
+    assert houghHash(showOverlayCheckBox=0) == houghHash(showOverlayCheckBox=2)
+
+
+def test_resumeOnlyWithSameFloatParameters(tmp_path):
+    file = str(tmp_path / 'a_video.tif')
+    output = tmp_path / 'a_features.h5'
+    output.write_bytes(b'')
+    Checkpoint([file], houghHash(), directory=str(tmp_path)).commit(file, 64, str(output))
+    assert Checkpoint([file], houghHash(sigmaSpinBox=1), resume=True, directory=str(tmp_path)).committedFrame(file) == 0
+    Checkpoint([file], houghHash(), directory=str(tmp_path)).commit(file, 64, str(output))
+    assert Checkpoint([file], houghHash(), resume=True, directory=str(tmp_path)).committedFrame(file) == 64
+
+
+def test_manifestRemovedWhenCompleted(tmp_path):
+    files = [str(tmp_path / 'a_video.tif'), str(tmp_path / 'b_video.tif')]
+    checkpoint = Checkpoint(files, houghHash(), directory=str(tmp_path))
+    checkpoint.complete(files[0], str(tmp_path / 'a_features.h5'))
+    assert os.path.isfile(checkpoint.file)
+    checkpoint.complete(files[1], str(tmp_path / 'b_features.h5'))
+    assert not os.path.exists(checkpoint.file)
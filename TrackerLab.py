@@ -34,26 +34,21 @@ from skimage.util import invert
 
 from scipy import ndimage
 import os, fnmatch, glob
-
-import imageio
-from nptdms import TdmsFile
+import tempfile
+import shutil
 
 import subprocess as sp # for calling ffmpeg
 
-from Utils import ScaleBar, Preferences, LineProfile
+from Utils import ScaleBar, Preferences, LineProfile, FrameSource, FrameCache, SeriesStatistics, VideoCache, Preprocessing, Batch, Checkpoint, Profiler, ProfilerPanel
+from Utils.FeatureWriter import openFeatureWriter
+from Modules.Utils.settings import moduleParameters, saveSettings
+from Modules.Utils.features import FeatureBuffer
+from Modules.Utils import registry
 
 import platform
+import time
 
-import importlib
-
-moduleNames = []
-for m in os.listdir('Modules'):
-    if os.path.isdir(os.path.join('Modules', m)) and m != 'Utils' and m != 'Template' and m != '__pycache__':
-       moduleNames.append(m)
-               
-moduleList = []
-for moduleName in moduleNames:
-    moduleList.append(importlib.import_module('Modules.' + moduleName + '.' + moduleName))
+moduleNames = registry.moduleNames() # the modules are imported when they are selected first, see Window.module()
 
 class Window(QMainWindow):
     def __init__(self):
@@ -90,6 +85,7 @@ class Window(QMainWindow):
         
         self.preferences.radioButtonHDF5.setChecked(self.hdf5)
         self.preferences.radioButtonCSV.setChecked(self.csv)
+        self.preferences.radioButtonParquet.setChecked(self.parquet)
         self.selectFilesButton.clicked.connect(self.selectFiles)
         self.addFilesButton.clicked.connect(self.appendFiles)
         self.removeFilesButton.clicked.connect(self.removeFiles)
@@ -111,22 +107,26 @@ class Window(QMainWindow):
         
         self.batchButton.clicked.connect(self.batchButtonClicked)
  
-        self.medianCheckBox.stateChanged.connect(self.update)  
-        self.subtractMeanCheckBox.stateChanged.connect(self.update)  
-        self.invertImageCheckBox.stateChanged.connect(self.update)  
-        self.medianSpinBox.valueChanged.connect(self.update)
-        self.softwareBinningSpinBox.valueChanged.connect(self.update)
+        self.medianCheckBox.stateChanged.connect(self.preprocessingChanged)  
+        self.subtractMeanCheckBox.stateChanged.connect(self.preprocessingChanged)  
+        self.invertImageCheckBox.stateChanged.connect(self.preprocessingChanged)  
+        self.medianSpinBox.valueChanged.connect(self.preprocessingChanged)
+        self.softwareBinningSpinBox.valueChanged.connect(self.preprocessingChanged)
+        self.precisionComboBox.currentIndexChanged.connect(self.preprocessingChanged)
+        self.medianMethodComboBox.currentIndexChanged.connect(self.preprocessingChanged)
         self.maskCheckBox.stateChanged.connect(self.maskCheckBoxChanged)
         self.maskTypeComboBox.currentIndexChanged.connect(self.maskTypeChanged) 
         self.roiCheckBox.stateChanged.connect(self.roiCheckBoxChanged)
         
-        self.mask = np.array([])
+        self.pipeline = None # pre-processing pipeline of the current settings, see preprocessingPipeline()
+        self.invariants = Preprocessing.InvariantCache() # binned mean, cropped mean and mask of the pipelines
         
         self.featureDetectionCheckBox.stateChanged.connect(self.featureDetectionCheckBoxChanged)
     
         self.exportTypeComboBox.currentIndexChanged.connect(self.exportTypeComboBoxChanged) 
         
         self.actionOpen.triggered.connect(self.selectFilesDialog)
+        self.actionResumeBatch.triggered.connect(self.resumeBatchClicked)
         self.actionExit.triggered.connect(self.close)
         self.actionSettings.triggered.connect(self.showPreferences)
         self.actionAbout.triggered.connect(self.aboutClicked)
@@ -146,6 +146,16 @@ class Window(QMainWindow):
         self.lineProfileWindow.setWindowFlags(QtCore.Qt.WindowStaysOnTopHint)
         self.lineProfileButton.clicked.connect(self.lineProfileButtonClicked)
         
+        # Timing of the processing stages in update(), shown in a dockable panel (Edit > Profiler) and as frame rate in the status bar
+        self.profiler = Profiler.Profiler()
+        self.profilerPanel = ProfilerPanel.ProfilerPanel(self.profiler)
+        self.addDockWidget(QtCore.Qt.RightDockWidgetArea, self.profilerPanel)
+        self.profilerPanel.hide()
+        self.menuEdit.addAction(self.profilerPanel.toggleViewAction())
+        self.profilerTimer = QtCore.QTimer()
+        self.profilerTimer.timeout.connect(self.profilerTimerTimeout)
+        self.profilerTimer.start(500)
+        
         graphicsLayout = pg.GraphicsLayoutWidget()
         self.layout.addWidget(graphicsLayout)
         
@@ -195,9 +205,12 @@ class Window(QMainWindow):
         self.scaleBar2.add(self.p2)
         
         self.batch = False
-        self.features = pd.DataFrame()
+        self.resume = False # resume the last batch run from its checkpoint
+        self.features = FeatureBuffer()
         
         self.statusBar.showMessage('Ready')
+        self.fpsLabel = QtGui.QLabel()
+        self.statusBar.addPermanentWidget(self.fpsLabel)
         self.progressBar = QtGui.QProgressBar()
         self.statusBar.addPermanentWidget(self.progressBar)
         self.cancelButton = QtGui.QPushButton("Cancel")
@@ -245,22 +258,17 @@ class Window(QMainWindow):
         
         self.exportVideo = False
         
-        # Setup the "Modules" tab widget
-        self.modules = []
-        for module in moduleList:
-            self.modules.append(module.Module())
-        
-        for module, moduleName in zip(self.modules, moduleNames):
-            self.modulesComboBox.addItem(moduleName)
-            self.moduleLayout.addWidget(module.widget)
-            module.widget.hide()
-            
-        self.moduleIndex = 0
-        self.modules[self.moduleIndex].widget.show()
+        # Setup the "Modules" tab widget. Only the names are listed, a module is imported and constructed when it is selected first.
+        self.modules = [None]*len(moduleNames)
+        self.moduleLoadTimes = {} # module name: (import, construction) in s
+        self.modulesComboBox.addItems(moduleNames)
+        moduleName = self.settings.value('Module', 'Connected-Component')
+        self.moduleIndex = moduleNames.index(moduleName) if moduleName in moduleNames else 0
+        self.modulesComboBox.setCurrentIndex(self.moduleIndex)
+        self.module().widget.show()
         self.modulesComboBox.currentIndexChanged.connect(self.moduleIndexChanged) 
 
-        self.modules[self.moduleIndex].attach(self.p2)
-        self.modules[self.moduleIndex].updated.connect(self.update)
+        self.module().attach(self.p2)
 
         
 
@@ -276,7 +284,7 @@ class Window(QMainWindow):
             self.lineProfileWindow.setWindowState(QtCore.Qt.WindowNoState)
             
     def lineProfileChanged(self):
-        line = self.lineSegmentROI.getArrayRegion(self.images[self.frameSlider.value()].T, self.im1)
+        line = self.lineSegmentROI.getArrayRegion(self.frame.T, self.im1)
         self.lineProfileWindow.p.plot(line, pen=pg.mkPen(color='b'), clear=True, antialias=True)   
         
         
@@ -291,7 +299,7 @@ class Window(QMainWindow):
             x = int(mousePoint.x())
             y = int(mousePoint.y()) 
             if x > 0 and x < self.dimx and y > 0 and y < self.dimy:
-                self.mouseLabel.setText("x = %d\ty = %d\t[%d]" % (x, y, self.images[self.frameSlider.value(), y ,x]))
+                self.mouseLabel.setText("x = %d\ty = %d\t[%d]" % (x, y, self.frame[y ,x]))
                 
         if self.p2.vb.sceneBoundingRect().contains(e):
             mousePoint = self.p2.vb.mapSceneToView(e)  
@@ -305,113 +313,146 @@ class Window(QMainWindow):
 
     def featureDetectionCheckBoxChanged(self):
         if self.featureDetectionCheckBox.checkState():
-            self.modules[self.moduleIndex].attach(self.p2)
+            self.module().attach(self.p2)
             self.moduleFrame.setEnabled(True)
         else:
-            self.modules[self.moduleIndex].detach()
+            self.module().detach()
             self.moduleFrame.setEnabled(False)
             self.im2.setLookupTable(self.colormaps[self.colormapComboBox.currentIndex()])
         self.update()
     
     
         
+    def module(self, index=None):
+        # Module with the index in the modulesComboBox (default: the selected module). The module is imported
+        # and constructed when it is used first, the durations are shown in the status bar.
+        index = self.moduleIndex if index is None else index
+        if self.modules[index] is None:
+            moduleName = moduleNames[index]
+            t0 = time.perf_counter()
+            moduleFile = registry.loadModule(moduleName)
+            t1 = time.perf_counter()
+            module = moduleFile.Module()
+            self.moduleLayout.addWidget(module.widget)
+            module.widget.hide()
+            module.updated.connect(self.update)
+            self.modules[index] = module
+            self.moduleLoadTimes[moduleName] = (t1 - t0, time.perf_counter() - t1)
+            message = 'Module %s loaded (import: %.2f s, construction: %.2f s)' % ((moduleName,) + self.moduleLoadTimes[moduleName])
+            print(message)
+            self.statusBar.showMessage(message, 5000)
+        return self.modules[index]
+
     def moduleIndexChanged(self):
-        self.modules[self.moduleIndex].detach()
-        self.modules[self.moduleIndex].widget.hide()
+        self.module().detach()
+        self.module().widget.hide()
         self.moduleIndex = self.modulesComboBox.currentIndex()
-        self.modules[self.moduleIndex].widget.show()
-        self.modules[self.moduleIndex].updated.connect(self.update)
-        self.modules[self.moduleIndex].attach(self.p2)
+        self.module().widget.show()
+        self.module().attach(self.p2)
         self.update()
         
         
     
-    def softwareBinning(self, arr_in, binning):
-        # Throw away the last rows and cols 
-        new_shape = tuple(np.array(arr_in.shape)//binning)
-        arr = arr_in[:binning*new_shape[0],:binning*new_shape[1]]
-        shape = (new_shape[0], arr.shape[0] // new_shape[0],
-                 new_shape[1], arr.shape[1] // new_shape[1])
-        return arr.reshape(shape).mean(-1).mean(1)
+    def preprocessingSettings(self):
+        # The pre-processing settings of the widgets, shared by the preview and the batch processing
+        settings = Preprocessing.Settings(binning=self.softwareBinningSpinBox.value(),
+                                          subtractMean=bool(self.subtractMeanCheckBox.checkState()),
+                                          median=self.medianSpinBox.value() if self.medianCheckBox.checkState() else 0,
+                                          invert=bool(self.invertImageCheckBox.checkState()),
+                                          dtype=Preprocessing.dtypes[self.precisionComboBox.currentIndex()],
+                                          medianMethod=Preprocessing.medianMethods[self.medianMethodComboBox.currentIndex()])
+        if self.roiCheckBox.checkState() and self.roi:
+            settings.roi = (int(self.roiX), int(self.roiY), int(self.roiW), int(self.roiH))
+        if self.maskCheckBox.checkState() and self.maskROI:
+            settings.mask = (self.maskTypeComboBox.currentIndex(), int(self.maskX), int(self.maskY), int(self.maskW), int(self.maskH))
+        return settings
+    
+    
+    def preprocessingChanged(self):
+        # Called by the pre-processing widgets, the ROI and the mask: the pipeline is created again by the next update()
+        self.pipeline = None
+        self.update()
         
         
-    def update(self):
+    def preprocessingPipeline(self):
+        # The pipeline is reused (with its buffers) until the settings, the ROI, the mask or the file change. The
+        # arrays which do not change with the new settings are reused from the invariant cache.
+        if self.pipeline is None:
+            if self.roiCheckBox.checkState():
+                self.roiChanged()
+            if self.maskCheckBox.checkState() and self.maskROI:
+                self.maskChanged()
+            settings = self.preprocessingSettings()
+            self.pipeline = Preprocessing.Pipeline(settings, self.meanSeriesImage if settings.subtractMean else None, self.invariants, self.displayedFile)
+        return self.pipeline
         
-        if self.softwareBinningSpinBox.value() > 1:
-            self.image1 = self.softwareBinning(self.images[self.frameSlider.value()], self.softwareBinningSpinBox.value())
-            self.dimx = self.image1.shape[0]
-            self.dimy = self.image1.shape[1]
-        else:
-            self.image1 = self.images[self.frameSlider.value()]
         
-        if self.scalingComboBox.currentIndex() == 0:
-            self.im1.setImage(self.image1)
-        else:
-            self.im1.setImage(self.image1, levels=[self.cminSpinBox.value(), self.cmaxSpinBox.value()])             
+    def update(self):
+        if not hasattr(self, 'images'):
+            return # no file loaded yet, e.g. the module settings are restored when the module is attached
         
-        self.processedImage = self.image1
-
-        # Image Pre-Processing 
-        if self.subtractMeanCheckBox.checkState():
-            try:
-                if self.softwareBinningSpinBox.value() > 1:
-                    self.meanSeriesImage_binned = self.softwareBinning(self.meanSeriesImage, self.softwareBinningSpinBox.value())
-                else: 
-                    self.meanSeriesImage_binned = self.meanSeriesImage
-            except: # there is a bug where this calculation is not done when a tdms is loaded initially with substract mean activated
-                self.meanSeriesImage = np.mean(self.images,axis=0) # image series mean for background subtraction
-                if self.softwareBinningSpinBox.value() > 1:
-                    self.meanSeriesImage_binned = self.softwareBinning(self.meanSeriesImage, self.softwareBinningSpinBox.value())
-                else: 
-                    self.meanSeriesImage_binned = self.meanSeriesImage
-            self.processedImage = self.processedImage - self.meanSeriesImage_binned
+        # Compute-only mode: during the batch processing the images, the overlay and the labels are only updated every refreshFrames frames
+        computeOnly = self.batch and not (self.refreshFrames and self.frameSlider.value() % self.refreshFrames == 0)
         
-
-        if self.medianCheckBox.checkState():
-            self.processedImage = ndimage.median_filter(self.processedImage, self.medianSpinBox.value())
-
+        with self.profiler.stage('frame load'):
+            self.frame = self.images[self.frameSlider.value()] # the current raw frame, read once from the frame source
         
-        if self.roiCheckBox.checkState():
-            self.processedImage = self.roi.getArrayRegion(self.processedImage, img=self.im1)
-            self.roiChanged()
+        pipeline = self.preprocessingPipeline() # the same pre-processing as the batch processing without GUI
         
+        if self.softwareBinningSpinBox.value() > 1:
+            self.dimx, self.dimy = pipeline.binnedShape(self.frame.shape)
         
-        if self.maskCheckBox.checkState() and self.maskROI:
-            self.maskChanged()
-            self.processedImage = self.mask*self.processedImage
-        
-
-        if self.invertImageCheckBox.checkState():
-            self.processedImage = -self.processedImage + np.max(self.processedImage)
+        # Image Pre-Processing: the full frame is only binned for the display, otherwise only the ROI is processed
+        if computeOnly:
+            self.processedImage = pipeline.process(self.frame[np.newaxis], self.profiler)[0]
+        else:
+            self.image1 = pipeline.bin(self.frame[np.newaxis], self.profiler)[0]
+            with self.profiler.stage('display'):
+                if self.scalingComboBox.currentIndex() == 0:
+                    self.im1.setImage(self.image1)
+                else:
+                    self.im1.setImage(self.image1, levels=[self.cminSpinBox.value(), self.cmaxSpinBox.value()])             
+            self.processedImage = pipeline.preprocess(self.image1[np.newaxis], self.profiler)[0]
         
 
         # Feature Detection
         features = pd.DataFrame()
-        if self.featureDetectionCheckBox.checkState():
-            self.im2.setImage(self.processedImage)
-            features = self.modules[self.moduleIndex].findFeatures(self.frameSlider.value(), self.im2)
-        else:
-            if self.scalingComboBox.currentIndex() == 0:
+        self.module().computeOnly = computeOnly
+        if self.featureDetectionCheckBox.checkState() and computeOnly:
+            with self.profiler.stage('detection'):
+                features = self.module().findFeatures(self.frameSlider.value(), Batch.ImageBuffer(self.processedImage))
+        elif self.featureDetectionCheckBox.checkState():
+            with self.profiler.stage('display'):
                 self.im2.setImage(self.processedImage)
-            else:
-                self.im2.setImage(self.processedImage, levels=[self.cminSlider.value(), self.cmaxSlider.value()])
+            with self.profiler.stage('detection + overlay'): # the overlay is drawn by the module
+                features = self.module().findFeatures(self.frameSlider.value(), self.im2)
+        elif computeOnly:
+            pass
+        else:
+            with self.profiler.stage('display'):
+                if self.scalingComboBox.currentIndex() == 0:
+                    self.im2.setImage(self.processedImage)
+                else:
+                    self.im2.setImage(self.processedImage, levels=[self.cminSlider.value(), self.cmaxSlider.value()])
         
         if self.batch:
-            self.features = self.features.append(features)
+            with self.profiler.stage('accumulation'):
+                self.features.extend(features)
+        self.profiler.frameDone()
             
 
     def maskTypeChanged(self):
         if self.maskTypeComboBox.currentIndex() == 0:
             self.p1.removeItem(self.maskROI)
             self.maskROI = pg.CircleROI([self.maskX, self.maskY], [self.maskW, self.maskH], maxBounds=QtCore.QRectF(0, 0, self.dimx, self.dimy), pen=(0, 10), scaleSnap=True, translateSnap=True)
-            self.maskROI.sigRegionChanged.connect(self.update)
+            self.maskROI.sigRegionChanged.connect(self.preprocessingChanged)
             self.p1.addItem(self.maskROI)
         else:
             self.p1.removeItem(self.maskROI)
             self.maskROI = pg.RectROI([self.maskX, self.maskY], [self.maskW, self.maskH], maxBounds=QtCore.QRectF(0, 0, self.dimx, self.dimy), pen=(0, 10), scaleSnap=True, translateSnap=True)
-            self.maskROI.sigRegionChanged.connect(self.update)
+            self.maskROI.sigRegionChanged.connect(self.preprocessingChanged)
             self.p1.addItem(self.maskROI)
-        self.update()
+        self.preprocessingChanged()
 
         
     def maskCheckBoxChanged(self):
@@ -426,7 +467,7 @@ class Window(QMainWindow):
                 self.maskROI = pg.CircleROI([self.maskX, self.maskY], [self.maskW, self.maskH], maxBounds=QtCore.QRectF(0, 0, self.dimx, self.dimy), pen=(0, 10), scaleSnap=True, translateSnap=True)
             else:
                 self.maskROI = pg.RectROI([self.maskX, self.maskY], [self.maskW, self.maskH], maxBounds=QtCore.QRectF(0, 0, self.dimx, self.dimy), pen=(0, 10), scaleSnap=True, translateSnap=True)                 
-            self.maskROI.sigRegionChanged.connect(self.update)
+            self.maskROI.sigRegionChanged.connect(self.preprocessingChanged)
             self.p1.addItem(self.maskROI)
             self.maskTypeComboBox.setEnabled(True)
             self.maskLabel.setVisible(True)
@@ -435,22 +476,12 @@ class Window(QMainWindow):
             self.maskROI = 0
             self.maskTypeComboBox.setEnabled(False)
             self.maskLabel.setVisible(False)
-        self.update()
+        self.preprocessingChanged()
         
         
     def maskChanged(self):
-            if self.roiCheckBox.checkState():
-                xx, yy= np.meshgrid(np.arange(self.roiX, self.roiX + self.roiW, 1), np.arange(self.roiY, self.roiY + self.roiH, 1))
-            else:
-                xx, yy= np.meshgrid(np.arange(0, self.dimx, 1), np.arange(0, self.dimy, 1))
-            if self.maskTypeComboBox.currentIndex() == 0:
-                self.maskX, self.maskY = self.maskROI.pos()
-                self.maskW, self.maskH = self.maskROI.size()
-                self.mask = (((xx - self.maskX - (self.maskW-1)/2)**2 + (yy - self.maskY - (self.maskH-1)/2)**2) < ((self.maskW)/2)**2).astype(int)
-            if self.maskTypeComboBox.currentIndex() == 1:
-                self.maskX, self.maskY =  self.maskROI.pos()
-                self.maskW, self.maskH = self.maskROI.size()
-                self.mask = ((np.abs(xx - self.maskX - self.maskW/2 + 1) <= (self.maskW+1)/2) & (np.abs(yy - self.maskY - self.maskH/2 + 1) <= (self.maskH+1)/2)).astype(int)
+            self.maskX, self.maskY = self.maskROI.pos()
+            self.maskW, self.maskH = self.maskROI.size()
             
             self.maskLabel.setText("<font color='#ff0000'>Mask: (%d, %d) (%d, %d)</font>" % (self.maskX, self.maskY, self.maskW, self.maskH))
             
@@ -464,7 +495,7 @@ class Window(QMainWindow):
             self.roi = 0   
         if not self.roi and self.roiCheckBox.checkState():
             self.roi = pg.RectROI([self.roiX,  self.roiY], [self.roiW, self.roiH], maxBounds=QtCore.QRectF(0, 0, self.dimx, self.dimy), pen=(3, 10), scaleSnap=True, translateSnap=True)
-            self.roi.sigRegionChanged.connect(self.update)
+            self.roi.sigRegionChanged.connect(self.preprocessingChanged)
             self.p1.addItem(self.roi)
             self.p2.setXLink(None)
             self.p2.setYLink(None)
@@ -480,7 +511,7 @@ class Window(QMainWindow):
             self.p2.setYLink(self.p1.vb)
             self.roiLabel.setVisible(False)
             self.scaleBar2.sizeChanged(self.dimx, self.dimy)
-        self.update()
+        self.preprocessingChanged()
         
         
     def roiChanged(self):
@@ -515,7 +546,7 @@ class Window(QMainWindow):
         if self.scalingComboBox.isEnabled():
             if self.scalingComboBox.currentIndex() == 0:
                 self.cminSlider.setValue(0)
-                self.cmaxSlider.setValue(np.max(self.images))
+                self.cmaxSlider.setValue(self.cmaxmax)
                 self.enableLevels(False)
             else:
                 self.enableLevels(True)
@@ -568,8 +599,8 @@ class Window(QMainWindow):
         if self.files:
             
             if not self.fileList:
-                self.modules[self.moduleIndex].attach(self.p2)
-                #self.modules[self.moduleIndex].updated.connect(self.update)
+                self.module().attach(self.p2)
+                #self.module().updated.connect(self.update)
                 self.p1.scene().sigMouseMoved.connect(self.mouseMoved)   
                 self.p2.getViewBox().scene().sigMouseMoved.connect(self.mouseMoved)
                 
@@ -649,8 +680,8 @@ class Window(QMainWindow):
                 self.im2.clear()
                 self.p1.scene().sigMouseMoved.disconnect(self.mouseMoved)   
                 self.p2.getViewBox().scene().sigMouseMoved.disconnect(self.mouseMoved)
-                self.modules[self.moduleIndex].detach()
-                #self.modules[self.moduleIndex].updated.disconnect(self.update)
+                self.module().detach()
+                #self.module().updated.disconnect(self.update)
                 self.mouseLabel.setText("x = 0\ty = 0\t[0]")
                 self.infoLabel.clear()
                 self.cminSlider.setValue(0)
@@ -674,6 +705,8 @@ class Window(QMainWindow):
         file = self.fileList[value]
         extension = os.path.splitext(file)[1]
         self.statusBar.showMessage('Loading: ' + os.path.basename(file))
+        if hasattr(self, 'images') and isinstance(self.images, FrameSource.FrameSource):
+            self.images.close() # release the previous file
         if extension == '.tdms':
             self.images = self.loadTDMSImages(file)
             #self.infoLabel.setText('Dimensions: ' + str(self.dimx) + ' x ' + str(self.dimy) + ' x ' + str(self.frames) + '<br>' + 'Binning: ' + str(self.binning) + '<br>' + 'Exposure: ' + str(self.exposure) + ' s')
@@ -692,16 +725,27 @@ class Window(QMainWindow):
         if extension == '.avi':
             self.images = self.loadAVIVideo(file)
             self.infoLabel.setText('Dimensions: ' + str(self.dimx) + ' x ' + str(self.dimy) + ' x ' + str(self.frames)) 
+        
+        # Image series mean for background subtraction and maximum for the levels from a single chunked pass 
+        # or the statistics cache. This has to be done before update() is called via the ROI and mask checkboxes.
+        self.statistics = SeriesStatistics.load(file, self.images)
+        self.meanSeriesImage = self.statistics.mean
+        self.displayedFile = file
+        self.pipeline = None
+        self.invariants.clear() # e.g. if the file was changed and loaded again
+        self.cmaxmax = self.statistics.max
+        
+        # Frames of lazily loaded files are cached and prefetched in the background for scrubbing
+        if isinstance(self.images, FrameSource.FrameSource):
+            self.images = FrameCache.CachedFrameSource(self.images, self.frameCacheSize*1024**2, self.prefetchFrames)
             
         if self.roiCheckBox.checkState():
             self.roiCheckBoxChanged()
         
         if self.maskCheckBox.checkState():
             self.maskCheckBoxChanged()
-            
-        self.meanSeriesImage = np.mean(self.images,axis=0) # image series mean for background subtraction
         
-        cmaxmax = np.max(self.images) 
+        cmaxmax = self.cmaxmax
         self.cminSlider.setMaximum(cmaxmax)
         self.cminSpinBox.setMaximum(2*cmaxmax)
         self.cmaxSlider.setMaximum(cmaxmax)
@@ -737,34 +781,22 @@ class Window(QMainWindow):
     
           
     def loadTDMSImages(self, file):
-        tdms_file = TdmsFile(file)
-        try:
-            p = tdms_file.properties # tdms_file.object().properties
-        except:
-            p = tdms_file.object().properties
-        self.dimx = int(p['dimx'])
-        self.dimy = int(p['dimy'])
-        self.binning = int(p['binning'])
-        # backward compatibility checks
-        try:
-            self.frames = int(p['dimz'])
-        except:
-            self.frames = int(p['frames'])
-        try:
-            self.exposure = float(p['exposure'].replace(',', '.'))
-        except:
-            self.exposure = float(p['exposure_time'].replace(',', '.'))
+        images = FrameSource.TDMSFrameSource(file) # only the header is read here, the frames are read on demand
+        self.dimx = images.dimx
+        self.dimy = images.dimy
+        self.binning = images.binning
+        self.frames = images.frames
+        self.exposure = images.exposure
+        p = images.properties
 
         info = ''
         info += 'Dimensions: ' + str(self.dimx) + ' x ' + str(self.dimy) + ' x ' + str(self.frames) + '<br>'
         info += 'Binning: ' + str(self.binning) + '<br>'
         info += 'Exposure: ' + str(self.exposure) + ' s<br>'
         
-        try:
-            self.kinetic_cycle = float(p['kinetic_cycle'].replace(',', '.'))
+        if images.kinetic_cycle:
+            self.kinetic_cycle = images.kinetic_cycle
             info += 'Kinetic Cycle: ' + str(self.kinetic_cycle) + ' s (' + '%.1f' % (1/self.kinetic_cycle) + ' fps)<br>'
-        except:
-            pass
         try:
             frame_transfer = int(p['frame_transfer'])
             info += 'Frame Transfer: ' 
@@ -781,36 +813,36 @@ class Window(QMainWindow):
             pass
             
         self.infoLabel.setText(info)
-        try:
-            images = tdms_file['Image']['Image'].data # tdms_file.channel_data('Image', 'Image')
-        except:
-            images = tdms_file.channel_data('Image', 'Image')
             
-        return images.reshape(self.frames, self.dimy, self.dimx)
+        return images
     
          
     def loadTIFFStack(self, file):
-        images = io.imread(file)
-        self.frames = images.shape[0]
-        self.dimy = images.shape[1]
-        self.dimx = images.shape[2]
+        images = FrameSource.TIFFFrameSource(file) # memory-mapped or decoded page by page on demand
+        self.frames = images.frames
+        self.dimy = images.dimy
+        self.dimx = images.dimx
         return images        
     
     def loadMP4Video(self, file):
-        video = imageio.get_reader(file)
-        self.dimx = video.get_meta_data()['size'][0]
-        self.dimy = video.get_meta_data()['size'][1]
-        self.frames = video.count_frames()
-        images = np.stack([video.get_data(i)[:,:,0] for i in range(self.frames)])
+        if self.videoCache:
+            images = VideoCache.openCached(file, FrameSource.VideoFrameSource, self.videoCacheSize*1024**3) # decoded once, then memory-mapped
+        else:
+            images = FrameSource.VideoFrameSource(file) # grayscale frames are streamed from FFmpeg on demand
+        self.dimx = images.dimx
+        self.dimy = images.dimy
+        self.frames = images.frames
         return images
     
         
     def loadAVIVideo(self, file):
-        video = imageio.get_reader(file)
-        self.dimx = video.get_meta_data()['size'][0]
-        self.dimy = video.get_meta_data()['size'][1]
-        self.frames = video.count_frames()
-        images = np.stack([video.get_data(i)[:,:,0] for i in range(self.frames)])
+        if self.videoCache:
+            images = VideoCache.openCached(file, FrameSource.VideoFrameSource, self.videoCacheSize*1024**3)
+        else:
+            images = FrameSource.VideoFrameSource(file)
+        self.dimx = images.dimx
+        self.dimy = images.dimy
+        self.frames = images.frames
         return images
 
     
@@ -835,7 +867,35 @@ class Window(QMainWindow):
         return images
     
     
+    def resumeBatchClicked(self):
+        self.resume = True
+        self.batchButtonClicked()
+        
+    
+    def batchCheckpoint(self):
+        # Completed files and the last committed frames are recorded in a manifest, i.e. a canceled or crashed 
+        # batch run can be resumed with "File > Resume Batch" if the parameters did not change
+        parameterHash = Checkpoint.parameterHash(self.preprocessingSettings(), self.modulesComboBox.currentText(), 
+                                                 self.detectionParameters(), 
+                                                 self.exportFormat(), self.exportSuffix)
+        checkpoint = Checkpoint.Checkpoint(self.fileList, parameterHash, self.resume)
+        self.resume = False
+        return checkpoint
+    
+    def detectionParameters(self):
+        # Module parameters for the metadata, the hash and the workers with the model file loaded in the GUI (YOLO)
+        parameters = moduleParameters(self.module().widget)
+        modelFile = getattr(self.module().parameters(), 'modelFile', None)
+        if modelFile:
+            parameters['modelFile'] = os.path.abspath(modelFile)
+        return parameters
+    
+    
     def batchButtonClicked(self):
+        if self.batchWorkers > 1 and (len(self.fileList) > 1 or self.chunkFrames):
+            self.parallelBatch()
+            return
+        checkpoint = self.batchCheckpoint()
         self.setEnabled(False)
         for item in self.fileListWidget.selectedItems():
             item.setSelected(False)
@@ -847,16 +907,59 @@ class Window(QMainWindow):
         self.cancelButton.setEnabled(True)
         processedFrames = 0
         totalFrames = self.images.shape[0]*len(self.fileList) # estimate the total number of frames from the first file
+        skipped = 0
        
         for f, file in enumerate(self.fileList):
-            self.features = pd.DataFrame()
+            if checkpoint.completed(file):
+                continue
+            
+            # Files whose outputs were written from the unchanged file with the same parameters are skipped without loading them
+            try:
+                output = Batch.unchangedOutput(file, self.preprocessingSettings(), self.modulesComboBox.currentText(), 
+                                               self.detectionParameters(), self.exportFormat(), self.exportSuffix)
+            except Exception:
+                output = None # the file is loaded and processed
+            if output:
+                checkpoint.complete(file, output)
+                processedFrames += totalFrames//len(self.fileList)
+                skipped += 1
+                continue
+            
             if self.fileListWidget.row(self.displayedItem) == 0 and f == 0:
                 pass
             else:
                 self.fileDoubleClicked(self.fileListWidget.item(f))
+            self.features = FeatureBuffer() # loading the file calls update(), i.e. the features are reset afterwards
             self.statusBar.showMessage('Feature Detection... Processing: ' + os.path.basename(file))
-            for j in range(self.images.shape[0]):
-                self.frameSlider.setValue(j) # this triggers update()
+            
+            # save metadata as data frame, the same as the batch processing without GUI (see Batch.unchangedOutput())
+            metadata = Batch.fileMetadata(file, self.images, self.preprocessingSettings(), 
+                                          self.modulesComboBox.currentText(), self.detectionParameters())
+            output = Batch.outputFile(file, self.exportSuffix, Batch.extensions[self.exportFormat()])
+            if self.profilerPanel.saveCheckBox.isChecked():
+                self.profiler.reset() # statistics per file
+            
+            # The features are written to the HDF5 or Parquet file in blocks of frames, i.e. an interrupted HDF5 file is readable up to the last block
+            writer = None
+            startFrame = 0
+            if self.hdf5 or self.parquet:
+                if self.hdf5:
+                    startFrame = min(checkpoint.committedFrame(file), self.images.shape[0])
+                writer = openFeatureWriter(output, metadata, resumeFrame=startFrame)
+            
+            frame = startFrame
+            for j in range(startFrame, self.images.shape[0]):
+                self.frameSlider.blockSignals(True) # no signal if the slider is already at the frame
+                self.frameSlider.setValue(j)
+                self.frameSlider.blockSignals(False)
+                self.frameSliderChanged(j) # update() once per frame
+                frame = j + 1
+                if writer and (j + 1) % Batch.flushFrames == 0:
+                    with self.profiler.stage('write'):
+                        writer.append(self.features.toDataFrame())
+                    if self.hdf5:
+                        checkpoint.commit(file, frame, output)
+                    self.features = FeatureBuffer()
                 processedFrames += 1
                 self.progressBar.setValue(processedFrames/totalFrames*100)
                 QtWidgets.QApplication.processEvents()
@@ -865,82 +968,21 @@ class Window(QMainWindow):
                     self.statusBar.showMessage('Ready')
                     break
             
-            # save metadata as data frame
-            metadata = pd.DataFrame([{'dimx': self.dimx,
-                                      'dimy': self.dimy,
-                                      'frames': self.frames,
-                                      'software_binning': self.softwareBinningSpinBox.value()}])
-
-            if os.path.splitext(file)[1] == '.tdms':
-                metadata['binning'] =  self.binning
-                metadata['exposure'] =  self.exposure
-                try:
-                    metadata['kinetic_cycle'] =  self.kinetic_cycle
-                except:
-                    pass
-            
-            if self.medianCheckBox.checkState():
-                metadata['median'] = self.medianSpinBox.value()
-            if self.invertImageCheckBox.checkState():
-                metadata['invert_image'] = self.invertImageCheckBox.checkState()
-            if self.subtractMeanCheckBox.checkState():
-                metadata['subtract_mean'] = self.subtractMeanCheckBox.checkState()
-            if self.maskCheckBox.checkState():
-                metadata['maskType'] = self.maskTypeComboBox.currentText()
-                metadata['maskX'] = int(self.maskX)
-                metadata['maskY'] = int(self.maskY)
-                metadata['maskW'] = int(self.maskW)
-                metadata['maskH'] = int(self.maskH)
-            if self.roiCheckBox.checkState():
-                metadata['roiX'] = int(self.roiX)
-                metadata['roiY'] = int(self.roiY)
-                metadata['roiW'] = int(self.roiW)
-                metadata['roiH'] = int(self.roiH)
-            
-            metadata['module'] = self.modulesComboBox.currentText()
-            for obj in self.modules[self.moduleIndex].widget.findChildren(QWidget): #self.tabWidget.currentWidget().findChildren(QtGui.QWidget):
-                if obj.metaObject().className() == 'QSpinBox':
-                    metadata[obj.objectName()] = obj.value();   
-                if obj.metaObject().className() == 'QCheckBox':
-                    metadata[obj.objectName()] = obj.checkState();
-                     
-                                
-            if self.preferences.suffixLineEdit.text():
-                self.exportPrefix = '_' + self.preferences.suffixLineEdit.text()
-            else:
-                self.exportPrefix = ''
-                
-            # Save protocol, metadata and features in CSV file
+            # Save protocol, metadata and features in CSV file or the remaining features in HDF5 file
+            features = self.features.toDataFrame()
             if self.csv:
-                file = os.path.splitext(file)[0].replace('_movie', '')
-                file = os.path.splitext(file)[0].replace('_video', '')
-                file += self.exportSuffix + '_features.csv'
-                if os.path.isfile(self.dir + '/' + self.protocolFile):
-                    info = []
-                    with open(self.dir + '/' + self.protocolFile, 'r') as f:
-                        for line in f:
-                            if '\n' in line: 
-                                info.append('#' + line)
-                            else:
-                                info.append('#' + line + '\n')
-                    with open(file, 'w') as f:
-                        for line in info:
-                            f.write(line)
-                    metadata.to_csv(file, mode='a')  
-                else:
-                    metadata.to_csv(file, mode='w')  
-                    
-                self.features.to_csv(file, mode='a')
-                
-            # Save features and metadata in HDF5 file
-            if self.hdf5:
-                file = os.path.splitext(file)[0].replace('_movie', '')
-                file = os.path.splitext(file)[0].replace('_video', '')
-                file += self.exportSuffix + '_features.h5'
-                store = pd.HDFStore(file, 'w')
-                store.put('features', self.features)
-                store.put('metadata', metadata)
-                store.close()
+                # Incomplete files are written without hash, i.e. they are processed again
+                output = Batch.writeFeatures(file, features, metadata.drop(columns='hash') if self.canceled else metadata, 
+                                             'csv', self.exportSuffix, self.dir + '/' + self.protocolFile)
+            if writer:
+                writer.append(features)
+                writer.close(complete=not self.canceled)
+                if self.hdf5:
+                    checkpoint.commit(file, frame, output)
+            if not self.canceled:
+                checkpoint.complete(file, output)
+                if self.profilerPanel.saveCheckBox.isChecked():
+                    self.profiler.dump(Batch.profileFile(output), file=file, module=self.modulesComboBox.currentText())
                 
             if self.canceled:
                 break
@@ -952,9 +994,59 @@ class Window(QMainWindow):
         self.cancelButton.setEnabled(False)
         if not self.canceled:
             self.progressBar.setValue(100)
-            self.statusBar.showMessage('Ready')
+            self.statusBar.showMessage('Ready (%d unchanged files skipped)' % skipped if skipped else 'Ready')
         self.batch = False
         self.canceled = False
+        self.update() # display the last frame with overlay
+
+
+    def parallelBatch(self):
+        # The files are distributed to worker processes which report their progress. The display is not updated.
+        self.setEnabled(False)
+        self.selectFilesButton.setEnabled(False)
+        self.addFilesButton.setEnabled(False)
+        self.removeFilesButton.setEnabled(False)
+        self.cancelButton.setEnabled(True)
+        
+        # The workers restore the module parameters from a copy of the current settings, the model file loaded in the GUI is passed
+        settingsDir = tempfile.mkdtemp()
+        settingsFile = os.path.join(settingsDir, 'Module.ini')
+        saveSettings(settingsFile, self.module().widget)
+        parameters = self.detectionParameters()
+        batch = Batch.ParallelBatch(self.fileList, self.preprocessingSettings(), self.modulesComboBox.currentText(), 
+                                    {name: value for name, value in parameters.items() if name in registry.fileParameters},
+                                    settingsFile=settingsFile, workers=self.batchWorkers, chunkFrames=self.chunkFrames, checkpoint=self.batchCheckpoint(),
+                                    moduleParameters=parameters,
+                                    format=self.exportFormat(), suffix=self.exportSuffix, profile=self.profilerPanel.saveCheckBox.isChecked(), protocolFile=self.protocolFile,
+                                    videoCache=bool(self.videoCache), videoCacheSize=self.videoCacheSize*1024**3)
+        self.statusBar.showMessage('Feature Detection... Processing %d files with %d workers' % (len(self.fileList), batch.workers))
+        while not batch.done():
+            self.progressBar.setValue(batch.poll(0.05)*100)
+            QtWidgets.QApplication.processEvents()
+            if self.canceled:
+                batch.cancel()
+                self.statusBar.showMessage('Canceling...')
+        batch.close()
+        shutil.rmtree(settingsDir, ignore_errors=True)
+        
+        errors = [os.path.basename(file) + ': ' + error for file, output, error in batch.results() if error]
+        for error in errors:
+            print('Error: ' + error)
+        
+        self.setEnabled(True)
+        self.selectFilesButton.setEnabled(True)
+        self.addFilesButton.setEnabled(True)
+        self.removeFilesButton.setEnabled(True)
+        self.cancelButton.setEnabled(False)
+        if self.canceled:
+            self.progressBar.setValue(0)
+            self.statusBar.showMessage('Ready')
+        elif errors:
+            self.statusBar.showMessage('%d of %d files failed (see console)' % (len(errors), len(self.fileList)))
+        else:
+            self.progressBar.setValue(100)
+            self.statusBar.showMessage('Ready (%d files skipped)' % len(batch.skipped) if batch.skipped else 'Ready')
+        self.canceled = False
 
     
     def exportVideoButtonClicked(self):
@@ -969,6 +1061,7 @@ class Window(QMainWindow):
         self.addFilesButton.setEnabled(False)
         self.removeFilesButton.setEnabled(False)
         self.batchButton.setEnabled(False)
+        self.actionResumeBatch.setEnabled(False)
         self.exportImageButton.setEnabled(False)
         self.exportVideoButton.setEnabled(False)
         
@@ -1066,6 +1159,7 @@ class Window(QMainWindow):
         self.addFilesButton.setEnabled(True)
         self.removeFilesButton.setEnabled(True)
         self.batchButton.setEnabled(True)
+        self.actionResumeBatch.setEnabled(True)
         self.exportImageButton.setEnabled(True)
         self.exportVideoButton.setEnabled(True)
         self.cancelButton.setEnabled(False)
@@ -1116,10 +1210,16 @@ class Window(QMainWindow):
 
     def cancelClicked(self, e):
         self.canceled = True
+        
+    def profilerTimerTimeout(self):
+        self.fpsLabel.setText('%.1f fps' % self.profiler.fps() if self.profiler.running() else '')
+        self.profilerPanel.refresh()
 
     def closeEvent(self, e):
         # Save the current settings in the TrackerLab.ini file
         self.saveSettings()
+        if hasattr(self, 'images') and isinstance(self.images, FrameSource.FrameSource):
+            self.images.close()
         e.accept()
         
     
@@ -1127,6 +1227,7 @@ class Window(QMainWindow):
         
         self.settings.setValue('Dir', self.dir)
         self.settings.setValue('TabIndex', self.modulesComboBox.currentIndex())
+        self.settings.setValue('Module', self.modulesComboBox.currentText())
         self.settings.setValue('TrackingState', self.featureDetectionCheckBox.checkState())
         self.settings.setValue('SelectedFilter', self.selectedFilter)
         self.settings.setValue('Pre-Processing/softwareBinning', self.softwareBinningSpinBox.value())
@@ -1134,6 +1235,8 @@ class Window(QMainWindow):
         self.settings.setValue('Pre-Processing/subtractMeanState', self.subtractMeanCheckBox.checkState())
         self.settings.setValue('Pre-Processing/medianValue', self.medianSpinBox.value())
         self.settings.setValue('Pre-Processing/invertImage', self.invertImageCheckBox.checkState())
+        self.settings.setValue('Pre-Processing/precision', self.precisionComboBox.currentIndex())
+        self.settings.setValue('Pre-Processing/medianMethod', self.medianMethodComboBox.currentIndex())
         self.settings.setValue('Pre-Processing/maskState', self.maskCheckBox.checkState())
         self.settings.setValue('Pre-Processing/maskType', self.maskTypeComboBox.currentIndex())
         self.settings.setValue('Pre-Processing/maskX', int(self.maskX))
@@ -1147,8 +1250,16 @@ class Window(QMainWindow):
         self.settings.setValue('Pre-Processing/roiH', int(self.roiH))
         self.settings.setValue('Preferences/HDF5', self.hdf5)
         self.settings.setValue('Preferences/CSV', self.csv)
+        self.settings.setValue('Preferences/Parquet', self.parquet)
         self.settings.setValue('Preferences/protocolFile', self.protocolFile)
         self.settings.setValue('Preferences/exportSuffix', self.exportSuffix)
+        self.settings.setValue('Preferences/frameCacheSize', self.frameCacheSize)
+        self.settings.setValue('Preferences/prefetchFrames', self.prefetchFrames)
+        self.settings.setValue('Preferences/videoCache', self.videoCache)
+        self.settings.setValue('Preferences/videoCacheSize', self.videoCacheSize)
+        self.settings.setValue('Preferences/batchWorkers', self.batchWorkers)
+        self.settings.setValue('Preferences/chunkFrames', self.chunkFrames)
+        self.settings.setValue('Preferences/refreshFrames', self.refreshFrames)
         self.settings.setValue('Video/exportTypeComboBox', self.exportTypeComboBox.currentIndex())
         self.settings.setValue('Video/exportViewComboBox', self.exportViewComboBox.currentIndex())
      
@@ -1186,17 +1297,35 @@ class Window(QMainWindow):
             self.roiY = int(self.settings.value('Pre-Processing/roiY', '0'))  
             self.roiW = int(self.settings.value('Pre-Processing/roiW', '100'))
             self.roiH = int(self.settings.value('Pre-Processing/roiH', '100'))
+            self.precisionComboBox.setCurrentIndex(int(self.settings.value('Pre-Processing/precision', '0')))
+            self.medianMethodComboBox.setCurrentIndex(int(self.settings.value('Pre-Processing/medianMethod', '0')))
         
             self.hdf5 = int(self.settings.value('Preferences/HDF5', '1'))
             self.csv = int(self.settings.value('Preferences/CSV', '0'))
+            self.parquet = int(self.settings.value('Preferences/Parquet', '0'))
             self.preferences.radioButtonHDF5.setChecked(self.hdf5)
             self.preferences.radioButtonCSV.setChecked(self.csv)
+            self.preferences.radioButtonParquet.setChecked(self.parquet)
             
        
             self.protocolFile = self.settings.value('Preferences/protocolFile', 'Protocol.txt')
             self.preferences.protocolFileLineEdit.setText(self.protocolFile)
             self.exportSuffix = self.settings.value('Preferences/exportSuffix', '')
             self.preferences.suffixLineEdit.setText(self.exportSuffix) 
+            self.frameCacheSize = int(self.settings.value('Preferences/frameCacheSize', '256'))
+            self.preferences.cacheSizeSpinBox.setValue(self.frameCacheSize)
+            self.prefetchFrames = int(self.settings.value('Preferences/prefetchFrames', '16'))
+            self.preferences.prefetchSpinBox.setValue(self.prefetchFrames)
+            self.videoCache = int(self.settings.value('Preferences/videoCache', '0'))
+            self.preferences.videoCacheCheckBox.setChecked(self.videoCache)
+            self.videoCacheSize = int(self.settings.value('Preferences/videoCacheSize', '10'))
+            self.preferences.videoCacheSizeSpinBox.setValue(self.videoCacheSize)
+            self.batchWorkers = int(self.settings.value('Preferences/batchWorkers', '1'))
+            self.preferences.workersSpinBox.setValue(self.batchWorkers)
+            self.chunkFrames = int(self.settings.value('Preferences/chunkFrames', '0'))
+            self.preferences.chunkFramesSpinBox.setValue(self.chunkFrames)
+            self.refreshFrames = int(self.settings.value('Preferences/refreshFrames', '100'))
+            self.preferences.refreshFramesSpinBox.setValue(self.refreshFrames)
             
             self.exportTypeComboBox.setCurrentIndex(int(self.settings.value('Video/exportTypeComboBox', '0')))
             self.exportViewComboBox.setCurrentIndex(int(self.settings.value('Video/exportViewComboBox', '0')))
@@ -1225,8 +1354,16 @@ class Window(QMainWindow):
             self.roiH = 100
             self.csv = 1
             self.hdf5 = 0
+            self.parquet = 0
             self.exportSuffix = ''
             self.protocolFile = 'Protocol.txt'
+            self.frameCacheSize = 256
+            self.prefetchFrames = 16
+            self.videoCache = 0
+            self.videoCacheSize = 10
+            self.batchWorkers = 1
+            self.chunkFrames = 0
+            self.refreshFrames = 100
             return 1
             
         
@@ -1248,6 +1385,7 @@ class Window(QMainWindow):
         self.invertImageCheckBox.setEnabled(state)
         self.enableLevels(state) 
         self.batchButton.setEnabled(state)
+        self.actionResumeBatch.setEnabled(state)
         self.preprocessingFrame.setEnabled(state)
         self.exportImageButton.setEnabled(state)
         if self.ffmpeg:
@@ -1268,6 +1406,11 @@ class Window(QMainWindow):
         self.scaleBar2Button.setEnabled(state)
 
 
+    def exportFormat(self):
+        if self.csv:
+            return 'csv'
+        return 'parquet' if self.parquet else 'hdf5'
+        
     def enableLevels(self, state): 
        self.cminSlider.setEnabled(state)  
        self.cminSpinBox.setEnabled(state) 
@@ -1278,13 +1421,29 @@ class Window(QMainWindow):
         if self.preferences.exec_() == QtGui.QDialog.Accepted:
             self.hdf5 = self.preferences.radioButtonHDF5.isChecked()
             self.csv = self.preferences.radioButtonCSV.isChecked()
+            self.parquet = self.preferences.radioButtonParquet.isChecked()
             self.exportSuffix = self.preferences.suffixLineEdit.text()
             self.protocolFile = self.preferences.protocolFileLineEdit.text()
+            self.frameCacheSize = self.preferences.cacheSizeSpinBox.value()
+            self.prefetchFrames = self.preferences.prefetchSpinBox.value()
+            self.videoCache = int(self.preferences.videoCacheCheckBox.isChecked())
+            self.videoCacheSize = self.preferences.videoCacheSizeSpinBox.value()
+            self.batchWorkers = self.preferences.workersSpinBox.value()
+            self.chunkFrames = self.preferences.chunkFramesSpinBox.value()
+            self.refreshFrames = self.preferences.refreshFramesSpinBox.value()
         else: # Rejected 
             self.preferences.radioButtonHDF5.setChecked(self.hdf5)
             self.preferences.radioButtonCSV.setChecked(self.csv)
+            self.preferences.radioButtonParquet.setChecked(self.parquet)
             self.preferences.suffixLineEdit.setText(self.exportSuffix)
             self.preferences.protocolFileLineEdit.setText(self.protocolFile)
+            self.preferences.cacheSizeSpinBox.setValue(self.frameCacheSize)
+            self.preferences.prefetchSpinBox.setValue(self.prefetchFrames)
+            self.preferences.videoCacheCheckBox.setChecked(self.videoCache)
+            self.preferences.videoCacheSizeSpinBox.setValue(self.videoCacheSize)
+            self.preferences.workersSpinBox.setValue(self.batchWorkers)
+            self.preferences.chunkFramesSpinBox.setValue(self.chunkFrames)
+            self.preferences.refreshFramesSpinBox.setValue(self.refreshFrames)
             
     
     def showScaleBar1Settings(self):
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+"""
+Discription: Headless batch processing of the TrackerLab without the GUI.
+             Example: python TrackerLabBatch.py "Data/*_video.tdms" --module Connected-Component --param thresholdSpinBox=50
+Author(s): M. Fränzl
+Data: 18/10/26
+"""
+
+import sys
+
+from Utils import Batch
+
+
+if __name__ == '__main__':
+    sys.exit(Batch.main())
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+"""
+Discription: Throughput benchmarks of the TrackerLab on synthetic image series.
+             Example: python TrackerLabBenchmark.py --sizes 512 --densities 2 10 --label master
+Author(s): M. Fränzl
+Data: 18/10/26
+"""
+
+import sys
+
+from Benchmarks import Benchmark
+
+
+if __name__ == '__main__':
+    sys.exit(Benchmark.main())
@@ -0,0 +1,745 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Batch processing of files without the GUI. The files are loaded, pre-processed,
+             the features are detected with one of the modules and written to the same
+             *_features.csv/*_features.h5 files as the batch processing of the GUI.
+             Usage: python TrackerLabBatch.py --help
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os, sys, glob, json, time
+import argparse
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty
+
+import numpy as np
+import pandas as pd
+
+from Utils import FrameSource, SeriesStatistics, Preprocessing, Checkpoint, ResultCache
+from Utils.Profiler import Profiler, stage
+from Utils.FeatureWriter import HDF5FeatureWriter, openFeatureWriter
+from Modules.Utils.features import FeatureBuffer
+from Modules.Utils import registry
+
+
+rootDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+flushFrames = 1000 # the features are written to HDF5 and Parquet files in blocks of frames
+extensions = {'hdf5': '.h5', 'csv': '.csv', 'parquet': '.parquet'} # of the features files per format
+
+
+def outputFile(file, suffix, extension):
+    # e.g. "Data/001_video.tdms" -> "Data/001" + suffix + "_features.h5"
+    file = os.path.splitext(file)[0].replace('_movie', '')
+    file = os.path.splitext(file)[0].replace('_video', '')
+    return file + suffix + '_features' + extension
+
+
+def buildMetadata(dimx, dimy, frames, settings, moduleName, moduleParameters, info=None, file=None):
+    # Metadata of a features file as data frame. info holds the camera metadata of TDMS files (binning, exposure, kinetic_cycle).
+    # With the input file, the hash of the result cache is added.
+    metadata = pd.DataFrame([{'dimx': dimx,
+                              'dimy': dimy,
+                              'frames': frames,
+                              'software_binning': settings.binning,
+                              'dtype': settings.dtype}])
+    if info:
+        for key, value in info.items():
+            if value is not None:
+                metadata[key] = value
+    if settings.median:
+        metadata['median'] = settings.median
+    if settings.invert:
+        metadata['invert_image'] = 2 # Qt.Checked
+    if settings.subtractMean:
+        metadata['subtract_mean'] = 2
+    if settings.mask:
+        maskType, maskX, maskY, maskW, maskH = settings.mask
+        metadata['maskType'] = Preprocessing.maskTypes[maskType]
+        metadata['maskX'] = int(maskX)
+        metadata['maskY'] = int(maskY)
+        metadata['maskW'] = int(maskW)
+        metadata['maskH'] = int(maskH)
+    if settings.roi:
+        roiX, roiY, roiW, roiH = settings.roi
+        metadata['roiX'] = int(roiX)
+        metadata['roiY'] = int(roiY)
+        metadata['roiW'] = int(roiW)
+        metadata['roiH'] = int(roiH)
+
+    metadata['module'] = moduleName
+    for name, value in moduleParameters.items():
+        metadata[name] = value
+    if file:
+        metadata['hash'] = ResultCache.resultHash(file, metadata)
+    return metadata
+
+
+def unchangedOutput(file, settings, moduleName, moduleParameters, format='hdf5', suffix=''):
+    # Output file if it was completely written from the same input file with the same metadata, otherwise None
+    output = outputFile(file, suffix, extensions[format])
+    if not os.path.isfile(output):
+        return None
+    images = FrameSource.openFile(file) # only the header is read
+    try:
+        metadata = fileMetadata(file, images, settings, moduleName, moduleParameters)
+    finally:
+        images.close()
+    return output if ResultCache.storedHash(output) == metadata['hash'][0] else None
+
+
+def fileMetadata(file, images, settings, moduleName, moduleParameters):
+    # Metadata with hash of the features file of an opened input file, the same for the GUI and the batch processing
+    dimy, dimx = binnedShape(images, settings)
+    return buildMetadata(dimx, dimy, images.shape[0], settings, moduleName, moduleParameters, cameraInfo(images), file)
+
+
+def cameraInfo(images):
+    # Camera metadata stored in TDMS files
+    info = {}
+    for key in ['binning', 'exposure', 'kinetic_cycle']:
+        try:
+            info[key] = getattr(images, key)
+        except AttributeError:
+            pass
+    return info
+
+
+def writeFeatures(file, features, metadata, format='hdf5', suffix='', protocolFile=None):
+    # Save protocol, metadata and features in a CSV file or features and metadata in a HDF5 or Parquet file
+    if format == 'csv':
+        file = outputFile(file, suffix, '.csv')
+        if protocolFile and os.path.isfile(protocolFile):
+            info = []
+            with open(protocolFile, 'r') as f:
+                for line in f:
+                    if '\n' in line:
+                        info.append('#' + line)
+                    else:
+                        info.append('#' + line + '\n')
+            with open(file, 'w') as f:
+                for line in info:
+                    f.write(line)
+            metadata.to_csv(file, mode='a')
+        else:
+            metadata.to_csv(file, mode='w')
+        features.to_csv(file, mode='a')
+
+    if format in ['hdf5', 'parquet']:
+        file = outputFile(file, suffix, extensions[format])
+        writer = openFeatureWriter(file)
+        writer.append(features)
+        writer.close(metadata)
+    return file
+
+
+class ImageBuffer:
+    # Stand-in for the pyqtgraph ImageItem passed to findFeatures()
+
+    def __init__(self, image=None):
+        self.image = image
+
+    def setImage(self, image, **kwargs):
+        self.image = image
+
+
+class NullPlot:
+    # Stand-in for the plot the modules draw their overlay on
+
+    def addItem(self, item):
+        pass
+
+    def removeItem(self, item):
+        pass
+
+
+class ModuleDetector:
+    # Runs the detection of a module from the Modules directory. The module widgets are created
+    # on the offscreen Qt platform, i.e. no display is required. The parameters are restored from
+    # the module INI file (the values last used in the GUI) and can be overwritten by name.
+
+    def __init__(self, moduleName, parameters=None, settingsFile=None):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PyQt5.QtWidgets import QApplication
+        from Modules.Utils.settings import restoreSettings, setParameters
+
+        cwd = os.getcwd()
+        os.chdir(rootDir) # the modules load their *.ui and *.ini files relative to the TrackerLab directory
+        try:
+            self.app = QApplication.instance() or QApplication(['TrackerLab'])
+            self.moduleObject = importlib.import_module('Modules.' + moduleName + '.' + moduleName)
+            self.module = self.moduleObject.Module()
+            self.module.attach(NullPlot())
+            if settingsFile:
+                restoreSettings(settingsFile, self.module.widget)
+        finally:
+            os.chdir(cwd)
+        if parameters:
+            setParameters(self.module.widget, parameters)
+        self.module.computeOnly = True # no output image, overlay and feature count
+        self.moduleName = moduleName
+        # The parameters are read from the widgets once, findFeaturesBatch() of the module is called directly
+        self.detectionParameters = self.module.parameters() if hasattr(self.moduleObject, 'findFeaturesBatch') else None
+
+    def parameters(self):
+        from Modules.Utils.settings import moduleParameters
+        return moduleParameters(self.module.widget)
+
+    def __call__(self, frame, image):
+        if self.detectionParameters is None:
+            return self.module.findFeatures(frame, ImageBuffer(image))
+        return self.moduleObject.findFeaturesBatch(image[np.newaxis], self.detectionParameters, [frame])
+
+    def detectBatch(self, frames, images):
+        # Features of a block of pre-processed images (N, H, W) with the frame numbers frames
+        if self.detectionParameters is None:
+            features = FeatureBuffer()
+            for frame, image in zip(frames, images):
+                features.extend(self(frame, image))
+            return features
+        return self.moduleObject.findFeaturesBatch(images, self.detectionParameters, frames)
+
+
+class KernelDetector:
+    # Runs findFeaturesBatch() of the kernel of a module without Qt. The parameters are the values of the input
+    # widgets, read from the *.ui and *.ini files of the module (see Modules/Utils/registry.py), i.e. the same
+    # values as for the ModuleDetector. The detector can be pickled and passed to worker processes.
+
+    def __init__(self, moduleName, parameters=None, settingsFile=None):
+        self.moduleName = moduleName
+        self.values = registry.widgetValues(moduleName, settingsFile, parameters)
+        self.detectionParameters = registry.loadKernel(moduleName).Parameters.fromWidgets(self.values)
+
+    def parameters(self):
+        return registry.moduleParameters(self.moduleName, self.values)
+
+    def __call__(self, frame, image):
+        return self.detectBatch([frame], image[np.newaxis])
+
+    def detectBatch(self, frames, images):
+        # Features of a block of pre-processed images (N, H, W) with the frame numbers frames
+        return registry.loadKernel(self.moduleName).findFeaturesBatch(images, self.detectionParameters, frames)
+
+
+def createDetector(moduleName, parameters=None, settingsFile=None):
+    # KernelDetector for modules with a kernel, otherwise ModuleDetector (requires PyQt5)
+    if registry.hasKernel(moduleName):
+        return KernelDetector(moduleName, parameters, settingsFile)
+    return ModuleDetector(moduleName, parameters, settingsFile)
+
+
+def meanImage(file, images, settings):
+    # Mean image for the background subtraction (binned by the pre-processing pipeline), the statistics are
+    # cached in a sidecar file
+    if not settings.subtractMean:
+        return None
+    return SeriesStatistics.load(file, images).mean
+
+
+def detectFeatures(images, settings, detector, meanImage=None, start=0, stop=None, progress=None, canceled=None, writer=None, checkpoint=None, 
+                   profiler=None, invariants=None, source=None):
+    # Pre-process the frames start ... stop - 1 and detect the features. Returns the features or None if canceled.
+    # With a writer, the features are appended to the writer every flushFrames frames instead and
+    # checkpoint(frame) is called with the number of frames written. With a profiler, the stages are timed.
+    # The frames are pre-processed and detected in blocks (split at the flushFrames boundaries). The binned mean
+    # and the mask are taken from the invariants cache with the source (the file), see Preprocessing.Pipeline.
+    # progress(frame, frames) is called after each block with the number of processed frames.
+    stop = images.shape[0] if stop is None else stop
+    pipeline = Preprocessing.Pipeline(settings, meanImage, invariants, source)
+    features = FeatureBuffer()
+    blocks = FrameSource.iterChunks(images, start=start, stop=stop)
+    while True:
+        t0 = time.perf_counter()
+        blockStart, block = next(blocks, (None, None))
+        if block is None:
+            break
+        if profiler:
+            profiler.add('frame load', time.perf_counter() - t0, block.shape[0])
+        a = 0
+        while a < block.shape[0]:
+            if canceled and canceled():
+                return None
+            b = min(block.shape[0], a + flushFrames - (blockStart + a - start) % flushFrames)
+            processedImages = pipeline.process(block[a:b], profiler)
+            with stage(profiler, 'detection', b - a):
+                blockFeatures = detector.detectBatch(range(blockStart + a, blockStart + b), processedImages)
+            with stage(profiler, 'accumulation', b - a):
+                features.extend(blockFeatures)
+            if progress:
+                progress(blockStart + b - start, stop - start)
+            if writer and (blockStart + b - start) % flushFrames == 0:
+                with stage(profiler, 'write'):
+                    writer.append(features.toDataFrame())
+                features = FeatureBuffer()
+                if checkpoint:
+                    checkpoint(blockStart + b)
+            if profiler:
+                profiler.frameDone(b - a)
+            a = b
+    if writer:
+        with stage(profiler, 'write'):
+            writer.append(features.toDataFrame())
+        features = FeatureBuffer()
+        if checkpoint:
+            checkpoint(stop)
+    return features
+
+
+def binnedShape(images, settings):
+    return tuple(np.array(images.shape[1:])//settings.binning) if settings.binning > 1 else images.shape[1:]
+
+
+def processFile(file, settings, detector, format='hdf5', suffix='', protocolFile='Protocol.txt', videoCache=False, videoCacheSize=10*1024**3,
+                progress=None, canceled=None, startFrame=0, checkpoint=None, profile=False):
+    # Returns the output file or None if canceled. HDF5 files can be continued from startFrame and
+    # checkpoint(frame, output) is called whenever the features up to frame are written.
+    # With profile, the timing of the stages is written to *_features_profile.json.
+    profiler = Profiler() if profile else None
+    images = FrameSource.openFile(file, videoCache, videoCacheSize)
+    try:
+        metadata = fileMetadata(file, images, settings, detector.moduleName, detector.parameters())
+        mean = meanImage(file, images, settings)
+        if format in ['hdf5', 'parquet']:
+            # Streamed to the file, an interrupted HDF5 file is readable up to the last block
+            startFrame = startFrame if format == 'hdf5' else 0
+            output = outputFile(file, suffix, extensions[format])
+            writer = openFeatureWriter(output, metadata, resumeFrame=startFrame)
+            features = None
+            try:
+                features = detectFeatures(images, settings, detector, mean, startFrame, progress=progress, canceled=canceled, writer=writer,
+                                          checkpoint=(lambda frame: checkpoint(frame, output)) if checkpoint and format == 'hdf5' else None, 
+                                          profiler=profiler)
+            finally:
+                writer.close(complete=features is not None)
+        else:
+            features = detectFeatures(images, settings, detector, mean, progress=progress, canceled=canceled, profiler=profiler)
+    finally:
+        images.close()
+    if features is None:
+        return None
+    if format == 'csv':
+        output = writeFeatures(file, features.toDataFrame(), metadata, format, suffix, protocolPath(file, protocolFile))
+    if profiler:
+        profiler.dump(profileFile(output), file=file, module=detector.moduleName)
+    return output
+
+
+def profileFile(output):
+    # e.g. "Data/001_features.h5" -> "Data/001_features_profile.json"
+    return os.path.splitext(output)[0] + '_profile.json'
+
+
+def protocolPath(file, protocolFile):
+    # The protocol file is located in the directory of the data files
+    return os.path.join(os.path.dirname(file), protocolFile) if protocolFile else None
+
+
+worker = None # (detector, progress queue, cancel event) of a worker process
+workerSource = None # (file, frame source) opened by a worker process for its frame chunks
+workerInvariants = Preprocessing.InvariantCache(4) # binned mean and mask for the chunks of the same file
+
+
+def initWorker(moduleName, parameters, settingsFile, queue, cancelEvent):
+    global worker
+    worker = (createDetector(moduleName, parameters, settingsFile), queue, cancelEvent)
+
+
+def processFileInWorker(file, startFrame, settings, options):
+    detector, queue, cancelEvent = worker
+    def progress(frame, frames): # once per block of frames
+        queue.put(('progress', file, frame, frames))
+    def checkpoint(frame, output):
+        queue.put(('checkpoint', file, frame, output))
+    return processFile(file, settings, detector, progress=progress, canceled=cancelEvent.is_set, startFrame=startFrame, checkpoint=checkpoint, **options)
+
+
+def processChunkInWorker(file, start, stop, settings, options):
+    # The worker opens the file itself and reads only its frames (memory-mapped for TIFF files and
+    # cached videos), i.e. no frames are transferred between the processes. The source is kept open
+    # for the next chunk of the same file.
+    global workerSource
+    detector, queue, cancelEvent = worker
+    if workerSource is None or workerSource[0] != file:
+        if workerSource:
+            workerSource[1].close()
+        workerSource = (file, FrameSource.openFile(file, options.get('videoCache', False), options.get('videoCacheSize', 10*1024**3)))
+    images = workerSource[1]
+    def progress(frame, frames): # once per block of frames
+        queue.put(('progress', (file, start), frame, frames))
+    features = detectFeatures(images, settings, detector, meanImage(file, images, settings), start, stop, progress, cancelEvent.is_set,
+                              invariants=workerInvariants, source=file)
+    if features is None:
+        return None
+    return features, detector.parameters()
+
+
+class ParallelBatch:
+    # Distributes the files to a pool of worker processes. Each worker loads, pre-processes, detects
+    # and writes its files independently and reports the processed frames through a queue.
+    # With chunkFrames, files with more frames are split into chunks of frames which are processed
+    # concurrently. The features of the chunks are merged in frame order and written by this process.
+    # With a checkpoint, completed files are skipped and HDF5 files are continued from the last committed frame.
+    # With the module parameters, files whose outputs are unchanged (see unchangedOutput()) are skipped.
+
+    def __init__(self, files, settings, moduleName, parameters=None, settingsFile=None, workers=None, chunkFrames=None, checkpoint=None, 
+                 moduleParameters=None, **options):
+        self.files = files
+        self.settings = settings
+        self.moduleName = moduleName
+        self.options = options
+        self.processedFrames = {}
+        self.totalFrames = {}
+        self.chunks = {} # chunk futures of the split files
+        self.outputs = {} # output files or errors of the split files
+        self.fileInfo = {}
+        self.merged = {} # number of chunks written per split file
+        self.chunkStops = {}
+        self.sinks = {} # (writer or feature buffer, metadata) of the split files
+        self.checkpoint = checkpoint
+        self.startFrames = {}
+        self.skipped = [] # files completed in a previous run or unchanged
+        self.recorded = set() # files recorded as completed in the checkpoint
+
+        tasks = []
+        for file in files:
+            output = checkpoint.completed(file) if checkpoint else None
+            if not output and moduleParameters is not None:
+                try:
+                    output = unchangedOutput(file, settings, moduleName, moduleParameters, options.get('format', 'hdf5'), options.get('suffix', ''))
+                except Exception:
+                    output = None # the error is reported by the worker
+            if output:
+                self.outputs[file] = (output, None)
+                self.skipped.append(file)
+                continue
+            if checkpoint and options.get('format', 'hdf5') == 'hdf5':
+                self.startFrames[file] = checkpoint.committedFrame(file)
+            if chunkFrames:
+                self.splitFile(file, chunkFrames, tasks)
+            else:
+                tasks.append((file, None, None))
+        self.workers = max(1, min(workers or os.cpu_count(), len(tasks)))
+        context = multiprocessing.get_context('spawn') # forking a process with a running Qt application is not safe
+        self.queue = context.Queue()
+        self.cancelEvent = context.Event()
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=initWorker,
+                                        initargs=(moduleName, parameters, settingsFile, self.queue, self.cancelEvent))
+        self.futures = []
+        for file, start, stop in tasks:
+            if start is None:
+                self.futures.append((file, self.pool.submit(processFileInWorker, file, self.startFrames.get(file, 0), settings, options)))
+            else:
+                future = self.pool.submit(processChunkInWorker, file, start, stop, settings, options)
+                self.chunks[file].append(future)
+                self.futures.append(((file, start), future))
+
+    def splitFile(self, file, chunkFrames, tasks):
+        # Files with up to chunkFrames frames are processed as a whole by one worker
+        try:
+            images = FrameSource.openFile(file, self.options.get('videoCache', False), self.options.get('videoCacheSize', 10*1024**3))
+        except Exception as e:
+            self.outputs[file] = (None, str(e))
+            return
+        try:
+            frames = images.shape[0]
+            startFrame = self.startFrames.get(file, 0)
+            if frames - startFrame <= chunkFrames:
+                tasks.append((file, None, None))
+                self.totalFrames[file] = frames - startFrame
+                return
+            meanImage(file, images, self.settings) # computed once here, the workers read the cached statistics
+            dimy, dimx = binnedShape(images, self.settings)
+            self.fileInfo[file] = (dimx, dimy, frames, cameraInfo(images))
+        finally:
+            images.close()
+        self.chunks[file] = []
+        self.chunkStops[file] = []
+        self.merged[file] = 0
+        for start in range(startFrame, frames, chunkFrames):
+            stop = min(start + chunkFrames, frames)
+            tasks.append((file, start, stop))
+            self.chunkStops[file].append(stop)
+            self.totalFrames[(file, start)] = stop - start
+
+    def poll(self, timeout=0.1):
+        # Collect the progress messages of the workers and return the estimated progress (0 ... 1)
+        try:
+            message = self.queue.get(timeout=timeout)
+            while True:
+                if message[0] == 'progress':
+                    _, key, frame, frames = message
+                    self.processedFrames[key] = frame
+                    self.totalFrames[key] = frames
+                elif self.checkpoint:
+                    _, file, frame, output = message
+                    self.checkpoint.commit(file, frame, output)
+                message = self.queue.get_nowait()
+        except Empty:
+            pass
+        self.mergeChunks()
+        self.recordCompleted()
+        return self.progress()
+
+    def recordCompleted(self):
+        # Record the completed files in the checkpoint
+        if not self.checkpoint:
+            return
+        for key, future in self.futures:
+            if not isinstance(key, str) or key in self.recorded or not future.done() or future.cancelled():
+                continue
+            if future.exception() is None and future.result():
+                self.checkpoint.complete(key, future.result())
+                self.recorded.add(key)
+
+    def mergeChunks(self):
+        # Write the features of the finished chunks in frame order. HDF5 files are written chunk by chunk as
+        # soon as the preceding chunks are finished, CSV files when all chunks of the file are finished.
+        for file, futures in self.chunks.items():
+            if file in self.outputs:
+                continue
+            try:
+                while file not in self.outputs and self.merged[file] < len(futures) and futures[self.merged[file]].done():
+                    future = futures[self.merged[file]]
+                    result = None if future.cancelled() else future.result()
+                    if result is None: # canceled
+                        self.finishFile(file, False)
+                    else:
+                        self.writeChunk(file, *result)
+                        self.merged[file] += 1
+                        if self.checkpoint and isinstance(self.sinks[file][0], HDF5FeatureWriter):
+                            self.checkpoint.commit(file, self.chunkStops[file][self.merged[file] - 1], self.sinks[file][0].file)
+                if file not in self.outputs and self.merged[file] == len(futures):
+                    self.finishFile(file, True)
+            except Exception as e:
+                self.finishFile(file, False, str(e))
+
+    def writeChunk(self, file, features, parameters):
+        if file not in self.sinks:
+            dimx, dimy, frames, info = self.fileInfo[file]
+            metadata = buildMetadata(dimx, dimy, frames, self.settings, self.moduleName, parameters, info, file)
+            format = self.options.get('format', 'hdf5')
+            if format in ['hdf5', 'parquet']:
+                sink = openFeatureWriter(outputFile(file, self.options.get('suffix', ''), extensions[format]), metadata, resumeFrame=self.startFrames.get(file, 0))
+            else:
+                sink = FeatureBuffer()
+            self.sinks[file] = (sink, metadata)
+        sink = self.sinks[file][0]
+        if not isinstance(sink, FeatureBuffer):
+            sink.append(features.toDataFrame())
+        else:
+            sink.extend(features)
+
+    def finishFile(self, file, complete, error=None):
+        output = None
+        if file in self.sinks:
+            sink, metadata = self.sinks.pop(file)
+            try:
+                if not isinstance(sink, FeatureBuffer):
+                    sink.close(complete=complete)
+                    output = sink.file if complete else None
+                elif complete:
+                    output = writeFeatures(file, sink.toDataFrame(), metadata, 'csv', self.options.get('suffix', ''),
+                                           protocolPath(file, self.options.get('protocolFile', 'Protocol.txt')))
+            except Exception as e:
+                error = error or str(e)
+        self.outputs[file] = (output, error)
+        if output and self.checkpoint:
+            self.checkpoint.complete(file, output)
+
+    def progress(self):
+        # The number of frames of files which are not started yet is estimated from the other files
+        if not self.totalFrames:
+            return 0
+        meanFrames = sum(self.totalFrames.values())/len(self.totalFrames)
+        processed = 0
+        total = 0
+        for key, future in self.futures:
+            frames = self.totalFrames.get(key, meanFrames)
+            total += frames
+            processed += frames if future.done() else self.processedFrames.get(key, 0)
+        return processed/total
+
+    def done(self):
+        return all(future.done() for _, future in self.futures) and all(file in self.outputs for file in self.chunks)
+
+    def cancel(self):
+        self.cancelEvent.set()
+        for _, future in self.futures:
+            future.cancel()
+
+    def results(self):
+        # (file, output file or None, error message or None) of the finished files
+        self.poll(0)
+        futures = dict(self.futures)
+        results = []
+        for file in self.files:
+            if file in self.outputs:
+                results.append((file,) + self.outputs[file])
+                continue
+            future = futures.get(file) # None for unfinished chunks
+            if future is None or future.cancelled() or not future.done():
+                results.append((file, None, None))
+            elif future.exception():
+                results.append((file, None, str(future.exception())))
+            else:
+                results.append((file, future.result(), None))
+        return results
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+def parseArguments(argv):
+    parser = argparse.ArgumentParser(prog='TrackerLabBatch', description='Feature detection for a list of files without the GUI.')
+    parser.add_argument('files', nargs='+', help='files or glob patterns, e.g. "Data/*_video.tdms"')
+    parser.add_argument('--config', help='JSON file with the pre-processing settings, "module" and "parameters"')
+    parser.add_argument('--module', help='name of the module in the Modules directory, e.g. Connected-Component')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE', help='module parameter by widget name, e.g. thresholdSpinBox=50, or the model file of YOLO, e.g. modelFile=yolo.pb')
+    parser.add_argument('--module-settings', help='module INI file with the parameters (default: the values last used in the GUI)')
+    parser.add_argument('--binning', type=int, help='software binning')
+    parser.add_argument('--median', type=int, help='median filter size')
+    parser.add_argument('--median-method', choices=Preprocessing.medianMethods, help='median filter: ndimage (default) or histogram (faster for large sizes of 8/16 bit images, same result)')
+    parser.add_argument('--subtract-mean', action='store_true', default=None, help='subtract the mean image of the series')
+    parser.add_argument('--invert', action='store_true', default=None, help='invert the image')
+    parser.add_argument('--roi', type=int, nargs=4, metavar=('X', 'Y', 'W', 'H'), help='region of interest')
+    parser.add_argument('--mask', nargs=5, metavar=('TYPE', 'X', 'Y', 'W', 'H'), help='mask with TYPE circle or rectangle')
+    parser.add_argument('--dtype', choices=Preprocessing.dtypes, help='working dtype of the pre-processing (default: float32)')
+    parser.add_argument('--format', choices=['hdf5', 'csv', 'parquet'], help='output format (default: hdf5)')
+    parser.add_argument('--suffix', help='suffix of the output files')
+    parser.add_argument('--protocol-file', help='protocol file in the data directory prepended to CSV files (default: Protocol.txt)')
+    parser.add_argument('--video-cache', action='store_true', default=None, help='cache decoded MP4/AVI videos on disk')
+    parser.add_argument('--force', action='store_true', help='process all files, also files whose outputs were written from the unchanged file with the same parameters')
+    parser.add_argument('--resume', action='store_true', help='resume the last run of the same files with the same parameters: completed files are skipped and HDF5 files are continued from the last checkpoint')
+    parser.add_argument('--profile', action='store_true', help='write the timing of the processing stages to *_features_profile.json (not for files split into chunks)')
+    parser.add_argument('--workers', type=int, help='number of worker processes for processing files in parallel (default: 1)')
+    parser.add_argument('--chunk-frames', type=int, help='split files with more frames into chunks processed in parallel by the workers')
+    return parser.parse_args(argv)
+
+
+def loadConfig(args):
+    # Merge the JSON configuration with the command line arguments, the latter take precedence
+    config = {}
+    if args.config:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    overrides = {'binning': args.binning,
+                 'median': args.median,
+                 'median_method': args.median_method,
+                 'subtract_mean': args.subtract_mean,
+                 'invert': args.invert,
+                 'roi': args.roi,
+                 'mask': args.mask,
+                 'dtype': args.dtype,
+                 'module': args.module,
+                 'module_settings': args.module_settings,
+                 'format': args.format,
+                 'suffix': args.suffix,
+                 'protocol_file': args.protocol_file,
+                 'video_cache': args.video_cache,
+                 'workers': args.workers,
+                 'chunk_frames': args.chunk_frames}
+    for key, value in overrides.items():
+        if value is not None:
+            config[key] = value
+    parameters = dict(config.get('parameters', {}))
+    for param in args.param:
+        name, value = param.split('=', 1)
+        parameters[name] = value
+    config['parameters'] = parameters
+    return config
+
+
+def expandFiles(patterns):
+    files = []
+    for pattern in patterns:
+        files += sorted(glob.glob(pattern)) or [pattern]
+    return [os.path.abspath(file) for file in files]
+
+
+def main(argv=None):
+    args = parseArguments(sys.argv[1:] if argv is None else argv)
+    config = loadConfig(args)
+    if not config.get('module'):
+        print('No module selected (--module or "module" in the config file).')
+        return 1
+    files = expandFiles(args.files)
+    settings = Preprocessing.Settings.fromDict(config)
+    moduleSettings = os.path.abspath(config['module_settings']) if config.get('module_settings') else None
+    options = {'format': config.get('format', 'hdf5'),
+               'suffix': config.get('suffix', ''),
+               'protocolFile': config.get('protocol_file', 'Protocol.txt'),
+               'videoCache': config.get('video_cache', False),
+               'profile': args.profile}
+
+    try:
+        detector = createDetector(config['module'], config['parameters'], moduleSettings)
+    except ValueError as e: # e.g. an unknown parameter or no model file
+        print('Error: ' + str(e))
+        return 1
+    checkpoint = Checkpoint.Checkpoint(files, Checkpoint.parameterHash(settings, config['module'], detector.parameters(), options['format'], options['suffix']), args.resume)
+
+    workers = int(config.get('workers', 1))
+    if workers > 1 and (len(files) > 1 or config.get('chunk_frames')):
+        return processParallel(files, settings, config, moduleSettings, workers, checkpoint, None if args.force else detector.parameters(), options)
+
+    errors = 0
+    for f, file in enumerate(files):
+        print('Processing (%d/%d): %s' % (f + 1, len(files), file))
+        output = checkpoint.completed(file)
+        if output:
+            print('  Skipped, completed in a previous run: ' + output)
+            continue
+        try:
+            output = None if args.force else unchangedOutput(file, settings, detector.moduleName, detector.parameters(), options['format'], options['suffix'])
+        except Exception:
+            output = None
+        if output:
+            print('  Skipped, unchanged: ' + output)
+            checkpoint.complete(file, output)
+            continue
+        startFrame = checkpoint.committedFrame(file) if options['format'] == 'hdf5' else 0
+        if startFrame:
+            print('  Resuming from frame %d' % startFrame)
+        t0 = time.time()
+        def progress(frame, frames): # once per block of frames
+            print('\r  %d/%d frames (%.1f fps)' % (frame, frames, frame/(time.time() - t0)), end='', flush=True)
+        def commit(frame, output):
+            checkpoint.commit(file, frame, output)
+        try:
+            output = processFile(file, settings, detector, progress=progress, startFrame=startFrame, checkpoint=commit, **options)
+            checkpoint.complete(file, output)
+            print('\n  Saved: ' + output)
+        except Exception as e:
+            print('\n  Error: ' + str(e))
+            errors += 1
+    if errors:
+        print('%d of %d files failed' % (errors, len(files)))
+    return 1 if errors else 0
+
+
+def processParallel(files, settings, config, moduleSettings, workers, checkpoint, moduleParameters, options):
+    batch = ParallelBatch(files, settings, config['module'], config['parameters'], moduleSettings, workers, config.get('chunk_frames'), checkpoint, 
+                          moduleParameters, **options)
+    print('Processing %d files with %d workers' % (len(files) - len(batch.skipped), batch.workers))
+    canceled = False
+    try:
+        while not batch.done():
+            print('\r  %.1f %%' % (100*batch.poll()), end='', flush=True)
+    except KeyboardInterrupt:
+        batch.cancel()
+        canceled = True
+    finally:
+        batch.close()
+    print()
+    errors = 0
+    for file, output, error in batch.results():
+        if error:
+            print('Error: ' + file + ': ' + error)
+            errors += 1
+        elif output:
+            print('Saved: ' + output)
+    if errors:
+        print('%d of %d files failed' % (errors, len(files)))
+    return 1 if errors or canceled else 0
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Checkpoint manifest of a batch run. The manifest records the completed
+             files and the last committed frame of partially processed files together
+             with a hash of the parameters, i.e. a canceled or crashed batch run can be
+             resumed with the same parameters. The manifest is removed when all files are completed.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import json
+import hashlib
+
+from Utils.FrameSource import cacheDirectory
+
+
+def parameterHash(settings, moduleName, parameters, format, suffix):
+    # Hash of everything that changes the features files of a batch run
+    parameters = {'preprocessing': settings.toDict(),
+                  'module': moduleName,
+                  'parameters': {name: str(value) for name, value in parameters.items()},
+                  'format': format,
+                  'suffix': suffix}
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+
+
+class Checkpoint:
+
+    def __init__(self, files, parameterHash, resume=False, directory=None):
+        # The manifest is identified by the list of files. A previous manifest is only used when resuming
+        # and if it was written with the same parameters.
+        if directory is None:
+            directory = cacheDirectory('Checkpoints')
+        self.files = [os.path.abspath(file) for file in files]
+        key = hashlib.sha1('|'.join(self.files).encode()).hexdigest()
+        self.file = os.path.join(directory, key + '.json')
+        self.parameterHash = parameterHash
+        self.entries = {}
+        if resume:
+            try:
+                with open(self.file, 'r') as f:
+                    manifest = json.load(f)
+                if manifest['parameterHash'] == parameterHash:
+                    self.entries = manifest['files']
+            except (OSError, ValueError, KeyError):
+                pass
+        self.save()
+
+    def completed(self, file):
+        # Output file of a completed file (if the output still exists) or None
+        entry = self.entries.get(os.path.abspath(file))
+        if entry and entry['complete'] and os.path.isfile(entry['output']):
+            return entry['output']
+        return None
+
+    def committedFrame(self, file):
+        # Number of frames whose features are safely written to the output file
+        entry = self.entries.get(os.path.abspath(file))
+        if entry and not entry['complete'] and os.path.isfile(entry['output']):
+            return entry['frame']
+        return 0
+
+    def commit(self, file, frame, output):
+        self.entries[os.path.abspath(file)] = {'complete': False, 'frame': frame, 'output': output}
+        self.save()
+
+    def complete(self, file, output):
+        self.entries[os.path.abspath(file)] = {'complete': True, 'output': output}
+        if all(self.entries.get(file, {}).get('complete') for file in self.files):
+            self.remove() # nothing to resume
+        else:
+            self.save()
+
+    def remove(self):
+        try:
+            os.remove(self.file)
+        except OSError:
+            pass
+
+    def save(self):
+        # Written to a temporary file first, i.e. the manifest is never left half written
+        temp = self.file + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'parameterHash': self.parameterHash, 'files': self.entries}, f, indent=1)
+        os.replace(temp, self.file)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Incremental writers for *_features.h5 and *_features.parquet files. The
+             features are appended in blocks to an appendable HDF5 table with the frame
+             number as indexed data column, i.e. the memory is bounded and the output of
+             an interrupted batch processing stays readable up to the last written block.
+             Parquet files are written with one row group per block of frames.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import json
+
+import pandas as pd
+
+
+def normalizeColumns(features, stringColumns):
+    # Files require a fixed column type: numbers are stored as float64 (the frame as int64) and
+    # other objects (e.g. the bbox tuples) as strings. The string columns are added to stringColumns.
+    features = features.copy()
+    for name in features.columns:
+        column = features[name]
+        if name == 'frame':
+            features[name] = column.astype('int64')
+        elif column.dtype.kind in 'biuf' and name not in stringColumns:
+            features[name] = column.astype('float64')
+        else:
+            features[name] = column.map(lambda value: '' if value is None or value is pd.NA or value != value else str(value)).astype(object)
+            stringColumns.add(name)
+    return features
+
+
+class HDF5FeatureWriter:
+    # The "complete" attribute of the metadata node is set when the file was closed regularly, e.g.
+    # pd.HDFStore(file).get_storer('metadata').attrs.complete
+
+    def __init__(self, file, metadata=None, minItemsize=64, resumeFrame=None):
+        # With resumeFrame, the features of the frames before resumeFrame are kept and new features are appended
+        self.file = file
+        self.minItemsize = minItemsize # length of string columns
+        self.rows = 0
+        self.columns = None
+        self.stringColumns = set()
+        if resumeFrame and os.path.isfile(file):
+            self.store = pd.HDFStore(file, 'a')
+            self.resume(resumeFrame)
+        else:
+            self.store = pd.HDFStore(file, 'w')
+        if metadata is not None:
+            self.writeMetadata(metadata, False)
+
+    def resume(self, frame):
+        # Features of frames which were written after the last checkpoint are removed
+        if 'features' not in self.store:
+            return
+        if not self.store.get_storer('features').is_table:
+            self.store.remove('features')
+            return
+        self.store.remove('features', where='frame >= %d' % frame)
+        existing = self.store.select('features', start=0, stop=0)
+        self.columns = list(existing.columns)
+        self.stringColumns = {name for name in existing.columns if existing[name].dtype.kind not in 'biuf'}
+        self.rows = self.store.get_storer('features').nrows
+
+    def writeMetadata(self, metadata, complete):
+        self.store.put('metadata', metadata)
+        self.store.get_storer('metadata').attrs.complete = complete
+        self.store.flush(fsync=True)
+
+    def normalize(self, features):
+        features = normalizeColumns(features, self.stringColumns)
+        features.index = pd.RangeIndex(self.rows, self.rows + len(features))
+        return features
+
+    def append(self, features):
+        if features is None or len(features) == 0:
+            return
+        if self.columns is not None and not set(features.columns) - set(self.columns):
+            features = self.normalize(features.reindex(columns=self.columns))
+            try:
+                self.store.append('features', features, format='table', data_columns=['frame'], min_itemsize=self.minItemsizes(features), index=False)
+            except (ValueError, TypeError):
+                self.rewrite(features)
+        elif self.columns is None:
+            features = self.normalize(features)
+            self.store.append('features', features, format='table', data_columns=['frame'], min_itemsize=self.minItemsizes(features), index=False)
+            self.columns = list(features.columns)
+        else:
+            self.rewrite(features)
+        self.rows += len(features)
+        self.store.flush(fsync=True)
+
+    def minItemsizes(self, features):
+        sizes = {name: max(self.minItemsize, features[name].str.len().max()) for name in features.columns if name in self.stringColumns}
+        return sizes or None
+
+    def rewrite(self, features):
+        # New columns (or longer strings) cannot be appended to an existing table, i.e. the table is written again
+        existing = self.store.select('features')
+        columns = list(existing.columns) + [name for name in features.columns if name not in existing.columns]
+        self.rows = 0
+        table = self.normalize(pd.concat([existing, features]).reindex(columns=columns))
+        self.store.remove('features')
+        self.store.append('features', table, format='table', data_columns=['frame'], min_itemsize=self.minItemsizes(table), index=False)
+        self.columns = columns
+        self.rows = len(existing) # the new rows are counted by append()
+
+    def close(self, metadata=None, complete=True):
+        if self.columns is None:
+            self.store.put('features', pd.DataFrame())
+        else:
+            self.store.create_table_index('features', columns=['frame'], optlevel=9, kind='full')
+        if metadata is not None:
+            self.writeMetadata(metadata, complete)
+        elif 'metadata' in self.store:
+            self.store.get_storer('metadata').attrs.complete = complete
+        self.store.close()
+
+
+parquetCompression = 'zstd' # compression of the feature columns
+parquetFrameCompression = 'snappy' # the frame column is sorted and small, i.e. it is decoded fast for filtering
+
+
+class ParquetFeatureWriter:
+    # Every block of features is written as one row group, i.e. the row group statistics of the frame column
+    # allow to read frame ranges, e.g. pd.read_parquet(file, columns=['x', 'y'], filters=[('frame', '<', 100)]).
+    # The metadata are stored as JSON in the key-value metadata of the file:
+    # json.loads(pq.read_metadata(file).metadata[b'metadata']). A Parquet file is only readable when it was closed.
+
+    def __init__(self, file, metadata=None):
+        import pyarrow # optional, only required for Parquet files
+        import pyarrow.parquet
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.file = file
+        self.path = file # the file is written to a temporary file after a rewrite
+        self.metadata = metadata
+        self.writer = None
+        self.schema = None
+        self.stringColumns = set()
+        self.rows = 0
+
+    def openWriter(self, file, schema):
+        # Floats are stored with byte stream split encoding which compresses much better
+        floats = [field.name for field in schema if self.pa.types.is_floating(field.type)]
+        compression = {field.name: parquetFrameCompression if field.name == 'frame' else parquetCompression for field in schema}
+        return self.pq.ParquetWriter(file, schema, compression=compression, use_dictionary=[name for name in schema.names if name not in floats],
+                                     use_byte_stream_split=floats or False)
+
+    def table(self, features):
+        features = normalizeColumns(features, self.stringColumns)
+        return self.pa.Table.from_pandas(features, schema=self.schema, preserve_index=False)
+
+    def append(self, features):
+        if features is None or len(features) == 0:
+            return
+        if self.schema is not None and not set(features.columns) - set(self.schema.names):
+            try:
+                table = self.table(features.reindex(columns=self.schema.names))
+            except (self.pa.ArrowInvalid, self.pa.ArrowTypeError):
+                table = None
+            if table is None:
+                self.rewrite(features)
+            else:
+                self.writer.write_table(table, row_group_size=len(table))
+        elif self.schema is None:
+            table = self.table(features)
+            self.schema = table.schema
+            self.writer = self.openWriter(self.path, self.schema)
+            self.writer.write_table(table, row_group_size=len(table))
+        else:
+            self.rewrite(features)
+        self.rows += len(features)
+
+    def rewrite(self, features):
+        # New columns (or columns changing from numbers to strings) require a new schema, i.e. the file is
+        # written again row group by row group
+        self.writer.close()
+        existing = self.pq.ParquetFile(self.path)
+        columns = list(self.schema.names) + [name for name in features.columns if name not in self.schema.names]
+        blocks = [existing.read_row_group(i).to_pandas() for i in range(existing.num_row_groups)] + [features]
+        self.schema = None
+        for block in blocks:
+            self.stringColumns.update(name for name in block.columns if block[name].dtype.kind not in 'biuf')
+        tables = []
+        for block in blocks:
+            table = self.table(block.reindex(columns=columns))
+            self.schema = self.schema or table.schema
+            tables.append(table.cast(self.schema))
+        previous = self.path
+        self.path = self.file + '.tmp' if self.path == self.file else self.file
+        self.writer = self.openWriter(self.path, self.schema)
+        for table in tables:
+            self.writer.write_table(table, row_group_size=len(table))
+        if previous != self.file:
+            os.remove(previous)
+
+    def close(self, metadata=None, complete=True):
+        metadata = self.metadata if metadata is None else metadata
+        if self.writer is None:
+            self.schema = self.pa.schema([])
+            self.writer = self.openWriter(self.path, self.schema)
+        keyValues = {'complete': json.dumps(bool(complete))}
+        if metadata is not None:
+            keyValues['metadata'] = metadata.iloc[0].to_json()
+        self.writer.add_key_value_metadata(keyValues)
+        self.writer.close()
+        if self.path != self.file:
+            os.replace(self.path, self.file)
+
+
+def openFeatureWriter(file, metadata=None, resumeFrame=None):
+    # Writer depending on the extension of the features file, only HDF5 files can be resumed
+    if os.path.splitext(file)[1] == '.parquet':
+        return ParquetFeatureWriter(file, metadata)
+    return HDF5FeatureWriter(file, metadata, resumeFrame=resumeFrame)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: LRU frame cache with a background prefetcher for scrubbing through
+             lazily loaded frame sources.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import threading
+from collections import OrderedDict
+
+from Utils.FrameSource import FrameSource
+
+
+class CachedFrameSource(FrameSource):
+    # Wraps a frame source. Frames are kept in an LRU cache limited to a memory budget (in bytes)
+    # and the next frames in the direction of scrubbing are decoded by a background thread.
+
+    def __init__(self, source, budget=256*1024**2, prefetch=16):
+        super().__init__()
+        self.source = source
+        self.frames, self.dimy, self.dimx = source.shape
+        self.dtype = source.dtype
+        self.budget = budget
+        self.cache = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock() # protects the cache
+        self.readLock = threading.Lock() # frame sources are not thread-safe
+        self.prefetcher = None
+        if prefetch > 0 and budget > 0:
+            self.prefetcher = Prefetcher(self, prefetch)
+            self.prefetcher.start()
+
+    def __getattr__(self, name):
+        # Forward e.g. properties, binning or exposure to the wrapped source
+        if name == 'source':
+            raise AttributeError(name)
+        return getattr(self.source, name)
+
+    def get(self, i):
+        with self.lock:
+            if i in self.cache:
+                self.cache.move_to_end(i)
+                return self.cache[i]
+        return None
+
+    def put(self, i, frame):
+        if frame.nbytes > self.budget:
+            return
+        with self.lock:
+            if i in self.cache:
+                return
+            self.cache[i] = frame
+            self.size += frame.nbytes
+            while self.size > self.budget:
+                _, evicted = self.cache.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def load(self, i):
+        frame = self.get(i)
+        if frame is None:
+            with self.readLock:
+                frame = self.get(i) # the prefetcher might have loaded the frame in the meantime
+                if frame is None:
+                    frame = self.source.readFrame(i)
+                    self.put(i, frame)
+        return frame
+
+    def readFrame(self, i):
+        frame = self.load(i)
+        if self.prefetcher:
+            self.prefetcher.request(i)
+        return frame
+
+    def readFrames(self, start, stop):
+        # Blocks (e.g. batch processing) are read directly and bypass the cache
+        with self.readLock:
+            return self.source.readFrames(start, stop)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.size = 0
+
+    def close(self):
+        if self.prefetcher:
+            self.prefetcher.stop()
+        self.clear()
+        with self.readLock:
+            self.source.close()
+
+
+class Prefetcher(threading.Thread):
+    # Decodes the next frames in the direction of the last frame requests.
+    # A new request interrupts the current prefetch run after the frame being decoded.
+
+    def __init__(self, cache, frames):
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.frames = frames
+        self.condition = threading.Condition()
+        self.index = None
+        self.direction = 1
+        self.pending = False
+        self.running = True
+
+    def request(self, i):
+        with self.condition:
+            if self.index is not None and i != self.index:
+                self.direction = 1 if i > self.index else -1
+            self.index = i
+            self.pending = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                self.pending = False
+                i = self.index
+                direction = self.direction
+            if direction > 0:
+                indices = range(i + 1, min(i + 1 + self.frames, self.cache.frames))
+            else:
+                indices = range(max(i - self.frames, 0), i) # in ascending order which is faster for video streams
+            for j in indices:
+                if self.pending or not self.running:
+                    break
+                try:
+                    self.cache.load(j)
+                except Exception as e:
+                    print('Prefetching frame ' + str(j) + ' failed: ' + str(e))
+                    break
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.join()
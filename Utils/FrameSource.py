@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Frame sources providing lazy, per-frame access to image series.
+             A frame source behaves like a read-only (frames, dimy, dimx) array:
+             source[i] returns a single frame, source[i:j] a block of frames.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os, re, shutil, platform
+import operator
+import bisect
+import subprocess as sp # for calling ffmpeg
+from collections import OrderedDict
+
+import numpy as np
+
+from nptdms import TdmsFile
+import tifffile
+
+
+class FrameSource:
+
+    def __init__(self):
+        self.frames = 0
+        self.dimy = 0
+        self.dimx = 0
+        self.dtype = np.dtype('uint8')
+
+    @property
+    def shape(self):
+        return (self.frames, self.dimy, self.dimx)
+
+    @property
+    def ndim(self):
+        return 3
+
+    def __len__(self):
+        return self.frames
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple): # e.g. source[frame, y, x]
+            return self[key[0]][key[1:]]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.frames)
+            if step == 1:
+                return self.readFrames(start, max(start, stop))
+            return np.stack([self.readFrame(i) for i in range(start, stop, step)])
+        if isinstance(key, (list, np.ndarray)):
+            return np.stack([self[i] for i in key])
+        i = operator.index(key)
+        if i < 0:
+            i += self.frames
+        if i < 0 or i >= self.frames:
+            raise IndexError('Frame index ' + str(key) + ' out of range (' + str(self.frames) + ' frames)')
+        return self.readFrame(i)
+
+    def readFrame(self, i):
+        raise NotImplementedError
+
+    def readFrames(self, start, stop):
+        # Subclasses may override this with a more efficient block read
+        if stop <= start:
+            return np.empty((0, self.dimy, self.dimx), dtype=self.dtype)
+        return np.stack([self.readFrame(i) for i in range(start, stop)])
+
+    def close(self):
+        pass
+
+
+class ArrayFrameSource(FrameSource):
+    # Wraps an image series that is already loaded into memory
+
+    def __init__(self, images):
+        super().__init__()
+        self.images = images
+        self.frames, self.dimy, self.dimx = images.shape[:3]
+        self.dtype = images.dtype
+
+    def readFrame(self, i):
+        return self.images[i]
+
+    def readFrames(self, start, stop):
+        return self.images[start:stop]
+
+    def close(self):
+        self.images = None # releases memory-mapped files
+
+
+class TDMSFrameSource(FrameSource):
+    # Only the header is read on opening, the frames are streamed from the file on demand
+
+    def __init__(self, file):
+        super().__init__()
+        self.file = file
+        try:
+            self.tdmsFile = TdmsFile.open(file) # streaming access (nptdms >= 0.23)
+            self.channel = self.tdmsFile['Image']['Image']
+            self.streaming = True
+        except AttributeError: # older nptdms versions read the whole file
+            self.tdmsFile = TdmsFile(file)
+            self.streaming = False
+        try:
+            p = self.tdmsFile.properties
+        except:
+            p = self.tdmsFile.object().properties
+        self.properties = p
+
+        self.dimx = int(p['dimx'])
+        self.dimy = int(p['dimy'])
+        self.binning = int(p['binning'])
+        # backward compatibility checks
+        try:
+            self.frames = int(p['dimz'])
+        except:
+            self.frames = int(p['frames'])
+        try:
+            self.exposure = float(p['exposure'].replace(',', '.'))
+        except:
+            self.exposure = float(p['exposure_time'].replace(',', '.'))
+        try:
+            self.kinetic_cycle = float(p['kinetic_cycle'].replace(',', '.'))
+        except:
+            self.kinetic_cycle = None
+
+        if self.streaming:
+            self.dtype = np.dtype(self.channel.dtype)
+        else:
+            try:
+                images = self.tdmsFile['Image']['Image'].data
+            except:
+                images = self.tdmsFile.channel_data('Image', 'Image')
+            self.images = images.reshape(self.frames, self.dimy, self.dimx)
+            self.dtype = self.images.dtype
+
+    def readFrame(self, i):
+        return self.readFrames(i, i + 1)[0]
+
+    def readFrames(self, start, stop):
+        if not self.streaming:
+            return self.images[start:stop]
+        n = self.dimx*self.dimy
+        data = self.channel[start*n:stop*n]
+        return np.asarray(data).reshape(-1, self.dimy, self.dimx)
+
+    def close(self):
+        if self.streaming:
+            self.tdmsFile.close()
+
+
+class TIFFFrameSource(FrameSource):
+    # Uncompressed stacks are memory-mapped, compressed stacks are decoded page by page 
+    # and the most recently decoded pages are kept in a small cache
+
+    def __init__(self, file, cacheSize=16):
+        super().__init__()
+        self.file = file
+        self.tiffFile = tifffile.TiffFile(file)
+        series = self.tiffFile.series[0]
+        self.dimy, self.dimx = series.shape[-2:]
+        self.frames = int(np.prod(series.shape[:-2])) # 1 for a single image
+        self.dtype = np.dtype(series.dtype)
+        try:
+            self.images = tifffile.memmap(file, mode='r').reshape(self.shape)
+            self.tiffFile.close()
+            self.tiffFile = None
+        except ValueError: # compressed or non-contiguous image data
+            self.images = None
+        self.cacheSize = cacheSize
+        self.pageCache = OrderedDict()
+
+    def readFrame(self, i):
+        if self.images is not None:
+            return self.images[i]
+        if i in self.pageCache:
+            self.pageCache.move_to_end(i)
+            return self.pageCache[i]
+        frame = self.tiffFile.asarray(key=i).reshape(self.dimy, self.dimx)
+        self.pageCache[i] = frame
+        if len(self.pageCache) > self.cacheSize:
+            self.pageCache.popitem(last=False)
+        return frame
+
+    def readFrames(self, start, stop):
+        if self.images is not None:
+            return self.images[start:stop]
+        return super().readFrames(start, stop)
+
+    def close(self):
+        if self.tiffFile is not None:
+            self.tiffFile.close()
+        self.images = None
+        self.pageCache.clear()
+
+
+def ffmpegExecutable():
+    # Prefer the bundled FFmpeg binary, then the one shipped with imageio and finally the system installation
+    for exe in ['FFmpeg/ffmpeg', 'FFmpeg/ffmpeg.exe']:
+        if os.path.isfile(exe):
+            return exe
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except:
+        return shutil.which('ffmpeg') or 'ffmpeg'
+
+
+class VideoFrameSource(FrameSource):
+    # Frames are decoded by FFmpeg in a single sequential pass and piped as grayscale raw video 
+    # (gray or gray16le), i.e. the RGB frames are never materialised. A packet index (frame timestamps 
+    # and keyframes) is built once on opening without decoding. Random access restarts the decoder 
+    # at the requested frame only if reading forward would cost more than seeking.
+
+    def __init__(self, file, ffmpeg=None, seekCost=10):
+        super().__init__()
+        self.file = file
+        self.ffmpeg = ffmpeg or ffmpegExecutable()
+        self.seekCost = seekCost # cost of restarting the decoder in units of decoded frames
+        self.buildIndex()
+        self.frameBytes = self.dimx*self.dimy*self.dtype.itemsize
+        self.process = None
+        self.position = 0 # index of the next frame delivered by the decoder
+        self.lastIndex = -1
+        self.lastFrame = None
+
+    def buildIndex(self):
+        # Stream copy into the framecrc muxer lists every video packet without decoding it
+        commands = [self.ffmpeg, '-hide_banner', '-nostats',
+                    '-copyts', # keep the original timestamps for seeking
+                    '-i', self.file,
+                    '-map', '0:v:0',
+                    '-c', 'copy',
+                    '-f', 'framecrc', '-']
+        result = sp.run(commands, stdout=sp.PIPE, stderr=sp.PIPE)
+        if result.returncode != 0:
+            raise IOError('FFmpeg could not read "' + self.file + '"')
+
+        info = result.stderr.decode(errors='ignore')
+        stream = re.search(r'Stream #.*?Video: (.*)', info).group(1)
+        self.dimx, self.dimy = [int(d) for d in re.search(r', (\d+)x(\d+)', stream).groups()]
+        if re.search(r'(p10|p12|p14|p16|gray16|48le|48be|64le|64be)', stream):
+            self.pixelFormat = 'gray16le'
+            self.dtype = np.dtype('<u2')
+        else:
+            self.pixelFormat = 'gray'
+            self.dtype = np.dtype('uint8')
+        fps = re.search(r'([\d.]+) fps', stream)
+        self.fps = float(fps.group(1)) if fps else None
+
+        pts = []
+        keyframes = []
+        for line in result.stdout.decode(errors='ignore').splitlines():
+            if line.startswith('#tb'):
+                num, den = line.split(':')[1].strip().split('/')
+                self.timeBase = int(num)/int(den)
+                continue
+            if line.startswith('#') or not line.strip():
+                continue
+            fields = [f.strip() for f in line.split(',')]
+            flags = int(fields[6].split('=')[1], 16) if len(fields) > 6 else 1 # the flags are only written for non-keyframes
+            pts.append(int(fields[2]))
+            keyframes.append(flags & 1)
+        order = np.argsort(pts, kind='stable') # packets are stored in decoding order
+        self.pts = np.array(pts)[order]
+        self.keyframes = np.flatnonzero(np.array(keyframes, dtype=bool)[order]).tolist()
+        self.frames = len(self.pts)
+
+    def seek(self, i):
+        self.stop()
+        commands = [self.ffmpeg, '-loglevel', 'quiet']
+        if i > 0:
+            # Seek to a time between frame i-1 and frame i. FFmpeg decodes from the preceding keyframe 
+            # and drops all frames before the requested time.
+            t = 0.5*(self.pts[i-1] + self.pts[i])*self.timeBase
+            commands += ['-seek_timestamp', '1', '-ss', '%.6f' % t]
+        commands += ['-i', self.file,
+                     '-map', '0:v:0',
+                     '-vsync', 'passthrough', # one frame per packet, no duplicated or dropped frames of variable frame rate videos
+                     '-f', 'rawvideo',
+                     '-pix_fmt', self.pixelFormat,
+                     '-']
+        self.process = sp.Popen(commands, stdout=sp.PIPE, stderr=sp.DEVNULL, bufsize=10*self.frameBytes)
+        self.position = i
+
+    def readNext(self):
+        data = self.process.stdout.read(self.frameBytes)
+        if len(data) < self.frameBytes:
+            raise IOError('Unexpected end of video stream at frame ' + str(self.position) + ' in "' + self.file + '"')
+        self.position += 1
+        return np.frombuffer(data, dtype=self.dtype).reshape(self.dimy, self.dimx)
+
+    def readFrame(self, i):
+        if i == self.lastIndex:
+            return self.lastFrame
+        keyframe = self.keyframes[bisect.bisect_right(self.keyframes, i) - 1] if self.keyframes else 0
+        if self.process is None or i < self.position or keyframe - self.position > self.seekCost:
+            self.seek(i)
+        while self.position <= i:
+            frame = self.readNext()
+        self.lastIndex = i
+        self.lastFrame = frame
+        return frame
+
+    def readFrames(self, start, stop):
+        if stop <= start:
+            return np.empty((0, self.dimy, self.dimx), dtype=self.dtype)
+        images = np.empty((stop - start, self.dimy, self.dimx), dtype=self.dtype)
+        for i in range(start, stop):
+            images[i - start] = self.readFrame(i)
+        return images
+
+    def stop(self):
+        if self.process is not None:
+            self.process.stdout.close()
+            self.process.kill()
+            self.process.wait()
+            self.process = None
+
+    def close(self):
+        self.stop()
+
+
+def openFile(file, videoCache=False, videoCacheSize=10*1024**3):
+    # Open a supported file as frame source depending on its extension
+    extension = os.path.splitext(file)[1].lower()
+    if extension == '.tdms':
+        return TDMSFrameSource(file)
+    if extension in ['.tif', '.tiff']:
+        return TIFFFrameSource(file)
+    if extension in ['.mp4', '.avi']:
+        if videoCache:
+            from Utils import VideoCache
+            return VideoCache.openCached(file, VideoFrameSource, videoCacheSize)
+        return VideoFrameSource(file)
+    if extension in ['.png', '.jpg', '.jpeg']:
+        from skimage import io
+        image = io.imread(file)
+        if image.ndim == 3:
+            image = image[:,:,0]
+        return ArrayFrameSource(image[np.newaxis,:,:])
+    raise ValueError('Unsupported file type "' + extension + '"')
+
+
+def iterChunks(images, chunkSize=64, start=0, stop=None):
+    # Iterate over the frames start ... stop - 1 of an image series (ndarray or frame source) in blocks of frames
+    stop = images.shape[0] if stop is None else stop
+    for i in range(start, stop, chunkSize):
+        yield i, np.asarray(images[i:min(i + chunkSize, stop)])
+
+
+def cacheDirectory(name):
+    # Per-user directory for cached data, e.g. %LOCALAPPDATA%/TrackerLab/Cache/<name> or ~/.cache/TrackerLab/<name>
+    if platform.system() == 'Windows' and os.environ.get('LOCALAPPDATA'):
+        root = os.path.join(os.environ['LOCALAPPDATA'], 'TrackerLab', 'Cache')
+    else:
+        root = os.path.join(os.path.expanduser('~'), '.cache', 'TrackerLab')
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
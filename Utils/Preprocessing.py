@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Image pre-processing (software binning, background subtraction, median
+             filter, ROI, mask and inversion) independent of the GUI widgets. The same
+             functions are used for the GUI preview and the batch processing.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from scipy import ndimage
+
+from Utils.Profiler import stage
+
+
+CIRCLE = 0 # mask types in the order of the maskTypeComboBox
+RECTANGLE = 1
+maskTypes = ['Circle', 'Rectangle']
+dtypes = ['float32', 'float64'] # working dtypes in the order of the precisionComboBox
+medianMethods = ['ndimage', 'histogram'] # in the order of the medianMethodComboBox
+
+
+class Settings:
+
+    def __init__(self, binning=1, subtractMean=False, median=0, roi=None, mask=None, invert=False, dtype='float32', medianMethod='ndimage'):
+        self.binning = binning
+        self.subtractMean = subtractMean
+        self.median = median # size of the median filter, 0 for no median filter
+        self.roi = roi # (x, y, w, h) or None
+        self.mask = mask # (type, x, y, w, h) or None
+        self.invert = invert
+        self.dtype = dtype # working dtype of the floating point stages, see Pipeline
+        self.medianMethod = medianMethod # 'histogram' for histogramMedian() of uint8/uint16 images
+
+    def toDict(self):
+        return {'binning': self.binning,
+                'subtract_mean': self.subtractMean,
+                'median': self.median,
+                'roi': list(self.roi) if self.roi else None,
+                'mask': list(self.mask) if self.mask else None,
+                'invert': self.invert,
+                'dtype': self.dtype,
+                'median_method': self.medianMethod}
+
+    @classmethod
+    def fromDict(cls, d):
+        mask = d.get('mask')
+        if mask and isinstance(mask[0], str):
+            mask = [maskTypes.index(mask[0].capitalize())] + list(mask[1:])
+        return cls(binning=int(d.get('binning', 1)),
+                   subtractMean=bool(d.get('subtract_mean', False)),
+                   median=int(d.get('median', 0) or 0),
+                   roi=tuple(int(v) for v in d['roi']) if d.get('roi') else None,
+                   mask=tuple(int(v) for v in mask) if mask else None,
+                   invert=bool(d.get('invert', False)),
+                   dtype=str(d.get('dtype', 'float32')),
+                   medianMethod=str(d.get('median_method', 'ndimage')))
+
+
+def softwareBinning(arr_in, binning):
+    # Throw away the last rows and cols
+    new_shape = tuple(np.array(arr_in.shape)//binning)
+    arr = arr_in[:binning*new_shape[0],:binning*new_shape[1]]
+    shape = (new_shape[0], arr.shape[0] // new_shape[0],
+             new_shape[1], arr.shape[1] // new_shape[1])
+    return arr.reshape(shape).mean(-1).mean(1)
+
+
+def histogramMedian(image, size, output=None, threads=None):
+    # Median filter of a uint8/uint16 image, identical to ndimage.median_filter(image, size) (square footprint, mode
+    # 'reflect'). The image is padded by reflection and split into bands of rows which are filtered by a thread pool
+    # with the sliding-window histogram median of scikit-image (Huang's algorithm, the cost per pixel grows with the
+    # size, not with the area of the footprint). The values of each band are replaced by their rank among the values
+    # in the band first, i.e. the histogram has only as many bins as distinct values. scikit-image warns about the
+    # performance for more than 1024 bins (still faster than ndimage for large sizes), the caller can ignore the
+    # warning once for all threads, see Pipeline.preprocessRegion().
+    from skimage.filters import rank
+    if image.dtype not in [np.uint8, np.uint16]:
+        raise ValueError('The histogram median requires uint8 or uint16 images')
+    before, after = size//2, size - 1 - size//2
+    padded = np.pad(image, ((before, after), (before, after)), mode='symmetric') # 'symmetric' is 'reflect' of ndimage
+    output = np.empty(image.shape, image.dtype) if output is None else output
+    footprint = np.ones((size, size), bool)
+    threads = threads or os.cpu_count() or 1
+    rows = max(-(-image.shape[0]//threads), size)
+
+    def band(start):
+        stop = min(start + rows, image.shape[0])
+        values = padded[start:stop + size - 1]
+        present = np.bincount(values.ravel(), minlength=1) > 0
+        ranks = (np.cumsum(present) - 1).astype(np.uint8 if present.sum() <= 256 else np.uint16)
+        median = rank.median(ranks[values], footprint)
+        output[start:stop] = np.flatnonzero(present)[median[before:before + stop - start, before:before + image.shape[1]]]
+
+    starts = range(0, image.shape[0], rows)
+    if len(starts) == 1:
+        band(0)
+    else:
+        with ThreadPoolExecutor(min(threads, len(starts))) as pool:
+            list(pool.map(band, starts))
+    return output
+
+
+def createMask(maskType, x, y, w, h, shape, offset=(0, 0)):
+    # Mask for an image of the given shape whose upper left corner is at offset (e.g. the ROI position)
+    xx, yy = np.meshgrid(np.arange(offset[0], offset[0] + shape[1], 1), np.arange(offset[1], offset[1] + shape[0], 1))
+    if maskType == CIRCLE:
+        return (((xx - x - (w-1)/2)**2 + (yy - y - (h-1)/2)**2) < ((w)/2)**2).astype(int)
+    else:
+        return ((np.abs(xx - x - w/2 + 1) <= (w+1)/2) & (np.abs(yy - y - h/2 + 1) <= (h+1)/2)).astype(int)
+
+
+def imageMask(settings, shape):
+    # Mask for the pre-processed image of a (binned) frame with the given shape
+    if not settings.mask:
+        return None
+    if settings.roi:
+        x, y, w, h = settings.roi
+        return createMask(*settings.mask, shape=(min(h, shape[0] - y), min(w, shape[1] - x)), offset=(x, y))
+    return createMask(*settings.mask, shape=shape)
+
+
+class InvariantCache:
+    # Arrays of the pre-processing which are the same for all frames of a file (binned mean, cropped mean and
+    # mask) by key, e.g. ('binned mean', file, binning). Shared by the pipelines of the GUI, i.e. a new pipeline
+    # (e.g. after the ROI was moved) only computes the arrays whose geometry changed. The least recently used
+    # arrays are dropped.
+
+    def __init__(self, maxItems=16):
+        self.maxItems = maxItems
+        self.items = OrderedDict()
+
+    def get(self, key, function):
+        # The array of the key, computed by function() if not cached
+        if key in self.items:
+            self.items.move_to_end(key)
+            return self.items[key]
+        value = function()
+        self.items[key] = value
+        if len(self.items) > self.maxItems:
+            self.items.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.items.clear()
+
+
+class Pipeline:
+    # Pre-processing of blocks of frames (N, H, W), the same for the GUI preview (blocks of one frame), the
+    # video export and the batch processing. The stages are applied in the order of stageOrder, disabled
+    # stages are skipped. The output buffers are allocated for the first block and reused for the next
+    # blocks, i.e. the returned images are only valid until the next block is processed.
+    # With a ROI, the frames are cropped first to the ROI and the margin required by the median filter, i.e.
+    # the cost scales with the ROI area. The result is the same as cropping after the median filter.
+    # The stages which require floating point numbers (binning, subtract mean) compute in the working dtype
+    # of the settings, the other stages keep the dtype of the frames, e.g. uint16 frames stay uint16 with
+    # median, mask and invert. With float64, the dtypes are promoted as by NumPy (mean, int mask), i.e.
+    # the images are the same as before the working dtype was introduced.
+
+    stageOrder = ['binning', 'subtract mean', 'median', 'roi/mask', 'invert']
+
+    def __init__(self, settings, meanImage=None, invariants=None, source=None):
+        # The meanImage is the mean of the series, i.e. not binned. The binned and cropped mean and the mask are
+        # taken from the invariants cache (see InvariantCache) in which the mean image is identified by the source,
+        # e.g. the file name.
+        if settings.subtractMean and meanImage is None:
+            raise ValueError('The mean image is required to subtract the mean')
+        if settings.dtype not in dtypes:
+            raise ValueError('Unknown dtype "' + str(settings.dtype) + '"')
+        self.settings = settings
+        self.dtype = np.dtype(settings.dtype)
+        self.promote = self.dtype == np.float64 # NumPy type promotion
+        self.meanImage = meanImage if settings.subtractMean else None
+        self.invariants = invariants if invariants is not None else InvariantCache()
+        self.source = source if source is not None else id(meanImage)
+        enabled = {'binning': settings.binning > 1,
+                   'subtract mean': settings.subtractMean,
+                   'median': settings.median > 0,
+                   'roi/mask': settings.roi is not None or settings.mask is not None,
+                   'invert': settings.invert}
+        self.stages = [name for name in self.stageOrder if enabled[name]]
+        self.shape = None # shape of the binned frames the region, the mean and the mask are computed for
+        self.buffers = {} # stage: output buffer
+
+    def matches(self, settings, meanImage=None):
+        # True if the pipeline can be reused for the settings and the mean image
+        return settings.toDict() == self.settings.toDict() and (not settings.subtractMean or meanImage is self.meanImage)
+
+    def buffer(self, name, shape, dtype):
+        # Output buffer of a stage for a block of the given shape, reallocated if the frames or the dtype change
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape[1:] != shape[1:] or buffer.shape[0] < shape[0] or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self.buffers[name] = buffer
+        return buffer[:shape[0]]
+
+    def binnedShape(self, shape):
+        # Shape of a binned frame for a raw frame of the given shape
+        return (shape[0]//self.settings.binning, shape[1]//self.settings.binning)
+
+    def setShape(self, shape):
+        # Region, mean and mask for binned frames of the given shape. The outer region is the ROI and the margin of
+        # the median filter (clipped to the frame), the inner region is the ROI relative to the outer region.
+        if shape == self.shape:
+            return
+        self.shape = shape
+        self.outer = (slice(0, shape[0]), slice(0, shape[1]))
+        self.inner = None
+        if self.settings.roi:
+            x, y, w, h = self.settings.roi
+            if x < 0 or y < 0: # cropped after the median filter (as by image[y:y + h, x:x + w])
+                self.inner = (slice(y, y + h), slice(x, x + w))
+            else:
+                before, after = (self.settings.median//2, self.settings.median - 1 - self.settings.median//2) if 'median' in self.stages else (0, 0)
+                y0, y1, x0, x1 = min(y, shape[0]), min(y + h, shape[0]), min(x, shape[1]), min(x + w, shape[1])
+                self.outer = (slice(max(y0 - before, 0), min(y1 + after, shape[0])), slice(max(x0 - before, 0), min(x1 + after, shape[1])))
+                self.inner = (slice(y0 - self.outer[0].start, y1 - self.outer[0].start), slice(x0 - self.outer[1].start, x1 - self.outer[1].start))
+        self.mean = None
+        if self.meanImage is not None:
+            outer = tuple((region.start, region.stop) for region in self.outer)
+            dtype = self.binnedMean().dtype if self.promote else self.dtype
+            self.mean = self.invariants.get(('cropped mean', self.source, self.settings.binning, shape, outer, dtype.str),
+                                            lambda: np.ascontiguousarray(self.binnedMean()[self.outer], dtype))
+        self.mask = None
+        if self.settings.mask:
+            self.mask = self.invariants.get(('mask', shape, self.settings.roi, self.settings.mask),
+                                            lambda: imageMask(self.settings, shape).astype(bool))
+
+    def binnedMean(self):
+        return self.invariants.get(('binned mean', self.source, self.settings.binning),
+                                   lambda: softwareBinning(self.meanImage, self.settings.binning) if self.settings.binning > 1 else self.meanImage)
+
+    def bin(self, block, profiler=None, name='binning'):
+        # Software binning of a block of raw frames, the block itself without binning
+        if 'binning' not in self.stages:
+            return block
+        with stage(profiler, 'binning', len(block)):
+            binning = self.settings.binning
+            h, w = block.shape[1]//binning, block.shape[2]//binning
+            dtype = self.dtype
+            if self.promote:
+                dtype = block.dtype if np.issubdtype(block.dtype, np.floating) else np.float64 # as mean() of the frames
+            binned = self.buffer(name, (len(block), h, w), dtype)
+            if binning < 8:
+                # Mean of the columns and then of the rows by adding strided views, the same summation order as mean()
+                # (sequential below 8 values) without the slow reduction over short axes
+                block = block[:, :binning*h, :binning*w]
+                columns = self.buffer(name + ' columns', (len(block), binning*h, w), dtype)
+                np.add(block[:, :, 0::binning], block[:, :, 1::binning], out=columns, dtype=dtype)
+                for j in range(2, binning):
+                    np.add(columns, block[:, :, j::binning], out=columns)
+                np.true_divide(columns, binning, out=columns)
+                np.add(columns[:, 0::binning], columns[:, 1::binning], out=binned)
+                for i in range(2, binning):
+                    np.add(binned, columns[:, i::binning], out=binned)
+                np.true_divide(binned, binning, out=binned)
+            else:
+                blocks = block[:, :binning*h, :binning*w].reshape(len(block), h, binning, w, binning)
+                columns = self.buffer(name + ' columns', (len(block), h, binning, w), dtype)
+                np.mean(blocks, axis=-1, dtype=dtype, out=columns)
+                np.mean(columns, axis=2, out=binned)
+        return binned
+
+    def preprocess(self, block, profiler=None):
+        # Pre-process a block of binned frames (see bin()), the block is not modified
+        self.setShape(block.shape[1:])
+        return self.preprocessRegion(block[(slice(None),) + self.outer], profiler)
+
+    def process(self, block, profiler=None):
+        # Binning and pre-processing of a block of raw frames. Only the outer region of the frames is binned.
+        self.setShape(self.binnedShape(block.shape[1:]))
+        b = self.settings.binning
+        outer = tuple(slice(region.start*b, region.stop*b) for region in self.outer)
+        return self.preprocessRegion(self.bin(block[(slice(None),) + outer], profiler, 'binning region'), profiler)
+
+    def preprocessRegion(self, block, profiler=None):
+        # Pre-process the outer region of a block of binned frames
+        n = len(block)
+        image = block
+        if 'subtract mean' in self.stages:
+            with stage(profiler, 'subtract mean', n):
+                output = self.buffer('subtract mean', image.shape, np.result_type(image, self.mean) if self.promote else self.dtype)
+                image = np.subtract(image, self.mean, out=output)
+
+        if 'median' in self.stages:
+            with stage(profiler, 'median', n):
+                output = self.buffer('median', image.shape, image.dtype)
+                if self.settings.medianMethod == 'histogram' and image.dtype in [np.uint8, np.uint16]:
+                    with warnings.catch_warnings(): # once per block in this thread, not in the threads of histogramMedian()
+                        warnings.filterwarnings('ignore', message='Bad rank filter performance', category=UserWarning)
+                        for k in range(n):
+                            histogramMedian(image[k], self.settings.median, output[k])
+                    image = output
+                else: # floating point images (e.g. after the binning) are always filtered by ndimage
+                    image = ndimage.median_filter(image, (1, self.settings.median, self.settings.median), output=output)
+
+        if 'roi/mask' in self.stages:
+            with stage(profiler, 'roi/mask', n):
+                if self.inner:
+                    image = image[(slice(None),) + self.inner]
+                if self.mask is not None:
+                    # As the int mask, in the working dtype for integer images (e.g. no overflow of uint16 sums in the modules)
+                    output = self.buffer('roi/mask', image.shape, np.result_type(int, image) if self.promote else np.result_type(self.dtype, image))
+                    image = np.multiply(self.mask, image, out=output)
+
+        if 'invert' in self.stages:
+            with stage(profiler, 'invert', n):
+                output = self.buffer('invert', image.shape, image.dtype)
+                image = np.subtract(np.max(image, axis=(1, 2), keepdims=True), image, out=output)
+
+        return image
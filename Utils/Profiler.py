@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Lightweight timing of the processing stages (frame load, binning, pre-processing,
+             detection, ...). The durations are kept in rolling windows for the mean and the
+             95th percentile per stage. Optionally, a number of frames can be captured with
+             cProfile. Independent of Qt, i.e. also used by the batch processing without GUI.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import json
+import time
+import cProfile
+import pstats
+from collections import deque, OrderedDict
+
+import numpy as np
+
+
+class Stage:
+    # Context manager adding the duration of the with block to a stage of the profiler. For a block of
+    # frames, the duration is split evenly among the frames.
+
+    def __init__(self, profiler, name, frames=1):
+        self.profiler = profiler
+        self.name = name
+        self.frames = frames
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, time.perf_counter() - self.t0, self.frames)
+
+
+class NoStage:
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *args):
+        pass
+
+
+noStage = NoStage()
+
+
+def stage(profiler, name, frames=1):
+    # Profiler.stage() which can be used if the profiler is None, e.g. with stage(profiler, 'median'): ...
+    return Stage(profiler, name, frames) if profiler is not None else noStage
+
+
+class Profiler:
+
+    def __init__(self, window=1000):
+        self.window = window # number of durations per stage for the rolling statistics
+        self.capture = None # (cProfile.Profile, remaining frames, file)
+        self.reset()
+
+    def reset(self):
+        self.durations = OrderedDict() # stage: deque of durations in s (in the order of the first call)
+        self.totals = {} # stage: (number of calls, total duration in s)
+        self.frameTimes = deque(maxlen=self.window)
+        self.frames = 0
+        self.start = time.perf_counter()
+
+    def stage(self, name, frames=1):
+        return Stage(self, name, frames)
+
+    def add(self, name, duration, frames=1):
+        # The duration of a stage for a number of frames, recorded as frames durations per frame
+        if name not in self.durations:
+            self.durations[name] = deque(maxlen=self.window)
+            self.totals[name] = (0, 0.0)
+        self.durations[name].extend([duration/frames]*frames)
+        count, total = self.totals[name]
+        self.totals[name] = (count + frames, total + duration)
+
+    def frameDone(self, frames=1):
+        # Called after each processed frame (or block of frames) for the frame rate and the cProfile capture
+        self.frameTimes.extend([time.perf_counter()]*frames)
+        self.frames += frames
+        if self.capture:
+            profile, remaining, file = self.capture
+            if remaining > frames:
+                self.capture = (profile, remaining - frames, file)
+            else:
+                self.stopCapture()
+
+    def fps(self):
+        # Frame rate of the last frames
+        if len(self.frameTimes) < 2 or self.frameTimes[-1] == self.frameTimes[0]:
+            return 0.0
+        return (len(self.frameTimes) - 1)/(self.frameTimes[-1] - self.frameTimes[0])
+
+    def running(self, timeout=1.0):
+        # True if a frame was processed within the last timeout seconds
+        return len(self.frameTimes) > 1 and time.perf_counter() - self.frameTimes[-1] < timeout
+
+    def statistics(self):
+        # {stage: {'mean_ms', 'p95_ms', 'count', 'total_s'}}, mean and p95 of the rolling window
+        statistics = OrderedDict()
+        for name, durations in self.durations.items():
+            values = np.fromiter(durations, float)
+            count, total = self.totals[name]
+            statistics[name] = {'mean_ms': 1000*float(values.mean()),
+                                'p95_ms': 1000*float(np.percentile(values, 95)),
+                                'count': count,
+                                'total_s': total}
+        return statistics
+
+    def toDict(self):
+        return {'frames': self.frames,
+                'fps': self.fps(),
+                'elapsed_s': time.perf_counter() - self.start,
+                'stages': self.statistics()}
+
+    def dump(self, fileName, **info):
+        # Write the statistics to a JSON file, info is added, e.g. the input file
+        data = dict(info)
+        data.update(self.toDict())
+        with open(fileName, 'w') as f:
+            json.dump(data, f, indent=1)
+        return fileName
+
+    def startCapture(self, frames, file):
+        # Profile the next frames with cProfile, the statistics are written to file (*.prof, e.g. for snakeviz)
+        # and the 20 most expensive functions are printed
+        self.stopCapture()
+        profile = cProfile.Profile()
+        self.capture = (profile, frames, file)
+        profile.enable()
+
+    def capturing(self):
+        return self.capture is not None
+
+    def stopCapture(self):
+        if not self.capture:
+            return None
+        profile, _, file = self.capture
+        self.capture = None
+        profile.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(file)), exist_ok=True)
+        profile.dump_stats(file)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+        return file
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Dockable panel showing the timing statistics of the processing stages
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import time
+
+from PyQt5.QtWidgets import QDockWidget, QTableWidgetItem
+from PyQt5.uic import loadUi
+
+from Utils.FrameSource import cacheDirectory
+
+
+class ProfilerPanel(QDockWidget):
+    
+    def __init__(self, profiler):
+        super().__init__()
+        
+        loadUi('Utils/ProfilerPanel.ui', self)
+        
+        self.profiler = profiler
+        self.resetButton.clicked.connect(self.resetClicked)
+        self.captureButton.clicked.connect(self.captureClicked)
+        
+    def refresh(self):
+        if self.isHidden():
+            return
+        statistics = self.profiler.statistics()
+        self.stagesTable.setRowCount(len(statistics))
+        for row, (name, values) in enumerate(statistics.items()):
+            for column, text in enumerate([name, '%.2f' % values['mean_ms'], '%.2f' % values['p95_ms'], str(values['count'])]):
+                self.stagesTable.setItem(row, column, QTableWidgetItem(text))
+        self.fpsLabel.setText('%.1f fps' % self.profiler.fps())
+        self.captureButton.setEnabled(not self.profiler.capturing())
+        
+    def resetClicked(self):
+        self.profiler.reset()
+        self.refresh()
+        
+    def captureClicked(self):
+        file = os.path.join(cacheDirectory('Profiles'), time.strftime('%Y%m%d_%H%M%S') + '.prof')
+        self.profiler.startCapture(self.captureFramesSpinBox.value(), file)
+        print('cProfile: capturing %d frames to %s' % (self.captureFramesSpinBox.value(), file))
+        self.refresh()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Result cache of the batch processing. A hash of the input file identity
+             (path, size, modification time) and the metadata of a features file is
+             stored in the metadata of the *_features.h5/.csv/.parquet file, i.e.
+             files whose outputs were written with the same parameters can be skipped.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import io
+import json
+import hashlib
+
+import pandas as pd
+
+
+def resultHash(file, metadata):
+    # The metadata holds the pre-processing, mask/ROI, module name and module parameters
+    stat = os.stat(file)
+    identity = {'file': os.path.abspath(file),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'metadata': {name: str(value) for name, value in metadata.iloc[0].items() if name != 'hash'}}
+    return hashlib.sha1(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def storedHash(output):
+    # Hash in the metadata of a completely written features file or None
+    if not os.path.isfile(output):
+        return None
+    try:
+        if os.path.splitext(output)[1] == '.h5':
+            with pd.HDFStore(output, 'r') as store:
+                if 'metadata' not in store or not getattr(store.get_storer('metadata').attrs, 'complete', True):
+                    return None
+                metadata = store['metadata']
+        elif os.path.splitext(output)[1] == '.parquet':
+            import pyarrow.parquet
+            keyValues = pyarrow.parquet.read_metadata(output).metadata
+            if not json.loads(keyValues[b'complete']):
+                return None
+            metadata = pd.DataFrame([json.loads(keyValues[b'metadata'])])
+        else:
+            # The metadata are the first two lines after the protocol
+            lines = []
+            with open(output, 'r') as f:
+                for line in f:
+                    if not line.startswith('#'):
+                        lines.append(line)
+                        if len(lines) == 2:
+                            break
+            metadata = pd.read_csv(io.StringIO(''.join(lines)), index_col=0)
+    except Exception:
+        return None
+    if 'hash' not in metadata.columns or len(metadata) == 0:
+        return None
+    return str(metadata['hash'].iloc[0])
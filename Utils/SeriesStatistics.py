@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: Image series statistics (mean image, minimum, maximum and intensity
+             histogram) computed in a single chunked pass and cached in a sidecar
+             file keyed by the file path, size and modification time.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import hashlib
+
+import numpy as np
+
+from Utils.FrameSource import iterChunks, cacheDirectory
+
+
+class SeriesStatistics:
+
+    def __init__(self, mean, cmin, cmax, histogram=None, frames=0):
+        self.mean = mean # float64 mean image for background subtraction
+        self.min = cmin
+        self.max = cmax
+        self.histogram = histogram # counts per intensity value (integer images only)
+        self.frames = frames
+
+
+def compute(images, chunkSize=64):
+    total = np.zeros(images.shape[1:], dtype=np.float64)
+    cmin = None
+    cmax = None
+    histogram = None
+    integer = np.issubdtype(images.dtype, np.integer) and images.dtype.itemsize <= 2
+    for start, block in iterChunks(images, chunkSize):
+        total += block.sum(axis=0, dtype=np.float64)
+        bmin = block.min()
+        bmax = block.max()
+        cmin = bmin if cmin is None else min(cmin, bmin)
+        cmax = bmax if cmax is None else max(cmax, bmax)
+        if integer:
+            offset = np.iinfo(block.dtype).min # 0 for unsigned integers
+            counts = np.bincount((block.ravel().astype(np.int64) - offset) if offset else block.ravel(), minlength=2**(8*block.dtype.itemsize))
+            histogram = counts if histogram is None else histogram + counts
+    return SeriesStatistics(total/images.shape[0], cmin, cmax, histogram, images.shape[0])
+
+
+def sidecarFile(file):
+    return os.path.join(cacheDirectory('Statistics'), hashlib.sha1(os.path.abspath(file).encode()).hexdigest() + '.npz')
+
+
+def load(file, images, chunkSize=64):
+    # Return the statistics of the image series from the sidecar cache or compute and cache them
+    stat = os.stat(file)
+    key = np.array([os.path.abspath(file), str(stat.st_size), str(stat.st_mtime_ns), str(images.shape)])
+    cache = sidecarFile(file)
+    try:
+        with np.load(cache) as data:
+            if np.array_equal(data['key'], key):
+                histogram = data['histogram'] if data['histogram'].size else None
+                return SeriesStatistics(data['mean'], data['min'][()], data['max'][()], histogram, int(data['frames']))
+    except (OSError, KeyError, ValueError):
+        pass
+
+    statistics = compute(images, chunkSize)
+    if images.shape[0] > 1: # single images are not worth caching
+        try:
+            with open(cache, 'wb') as f:
+                np.savez_compressed(f, key=key,
+                                    mean=statistics.mean,
+                                    min=statistics.min,
+                                    max=statistics.max,
+                                    histogram=statistics.histogram if statistics.histogram is not None else np.array([]),
+                                    frames=statistics.frames)
+        except OSError as e:
+            print('Series statistics could not be cached: ' + str(e))
+    return statistics
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Discription: On-disk cache of decoded videos. A video is transcoded once into a raw
+             uint8/uint16 frame store with a JSON header and subsequently read as a
+             memory-mapped array. The cache size is capped with LRU eviction.
+Author(s):   M. Fränzl
+Data:        18/10/26
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from Utils.FrameSource import ArrayFrameSource, cacheDirectory
+
+
+def cacheKey(file):
+    stat = os.stat(file)
+    key = os.path.abspath(file) + '|' + str(stat.st_size) + '|' + str(stat.st_mtime_ns)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def openCached(file, openSource, maxSize=10*1024**3, cacheDir=None, chunkSize=64):
+    # Return a memory-mapped frame source for the decoded video, transcoding it first if it is not cached yet.
+    # The decoder openSource(file), e.g. VideoFrameSource, is only opened (and its packet index built) if the
+    # video is not cached.
+    if cacheDir is None:
+        cacheDir = cacheDirectory('Videos')
+    key = cacheKey(file)
+    headerFile = os.path.join(cacheDir, key + '.json')
+    rawFile = os.path.join(cacheDir, key + '.raw')
+
+    header = readHeader(headerFile)
+    if header is None or not header['complete'] or not os.path.isfile(rawFile):
+        source = openSource(file)
+        images = None
+        try:
+            header = {'file': os.path.abspath(file),
+                      'frames': source.frames,
+                      'dimy': source.dimy,
+                      'dimx': source.dimx,
+                      'dtype': source.dtype.str,
+                      'complete': False}
+            with open(headerFile, 'w') as f:
+                json.dump(header, f)
+            images = np.memmap(rawFile, dtype=source.dtype, mode='w+', shape=source.shape)
+            for start in range(0, source.frames, chunkSize):
+                images[start:start + chunkSize] = source[start:start + chunkSize]
+            images.flush()
+            images = None
+            header['complete'] = True # the header is completed last, an interrupted transcoding is redone
+            with open(headerFile, 'w') as f:
+                json.dump(header, f)
+        except BaseException: # e.g. a decoding error or KeyboardInterrupt: the partial files are removed
+            images = None # the memory map is closed before the raw file is removed
+            for partialFile in [rawFile, headerFile]:
+                try:
+                    os.remove(partialFile)
+                except OSError:
+                    pass
+            raise
+        finally:
+            source.close() # e.g. the FFmpeg process
+        evict(cacheDir, maxSize, keep=key)
+    else:
+        os.utime(headerFile) # mark as recently used
+
+    images = np.memmap(rawFile, dtype=np.dtype(header['dtype']), mode='r', shape=(header['frames'], header['dimy'], header['dimx']))
+    return ArrayFrameSource(images)
+
+
+def readHeader(headerFile):
+    try:
+        with open(headerFile, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def evict(cacheDir, maxSize, keep=None):
+    # Delete the least recently used entries until the cache is smaller than maxSize (in bytes)
+    entries = []
+    for name in os.listdir(cacheDir):
+        key, extension = os.path.splitext(name)
+        if extension != '.json':
+            continue
+        headerFile = os.path.join(cacheDir, name)
+        rawFile = os.path.join(cacheDir, key + '.raw')
+        size = os.path.getsize(rawFile) if os.path.isfile(rawFile) else 0
+        entries.append((os.path.getmtime(headerFile), key, size))
+    total = sum(size for _, _, size in entries)
+    for _, key, size in sorted(entries):
+        if total <= maxSize:
+            break
+        if key == keep:
+            continue
+        for extension in ['.raw', '.json']:
+            try:
+                os.remove(os.path.join(cacheDir, key + extension))
+            except OSError:
+                pass
+        total -= size
+